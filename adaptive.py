@@ -0,0 +1,207 @@
+'''
+Created on Oct 16, 2026
+
+Adaptive per-page choice of compression algorithm. A vectorized probe
+measures each page's zero-word fraction, byte-histogram entropy and
+number of distinct words. From these the compressor predicts the ratio
+WK and WK with per-section Huffman coding would reach, and uses the
+cheapest algorithm expected to meet a target ratio. lzma is used when
+neither is expected to meet it. Pages that look incompressible, or that
+do not shrink, are stored raw. Each compressed page starts with a one
+byte tag recording the decision.
+'''
+
+import time
+import lzma
+import argparse
+from collections import namedtuple
+import numpy as np
+from wk import WKCompressor, HEADER_SIZE_BYTES, TAGS_PER_PACKED_BYTE, PAGE_SIZE_BYTES, _WORD_DTYPES
+from wk_huffman import WKHuffmanCompressor
+import trace_reader
+
+# Decision tags, in order of increasing cost
+ZERO_PAGE = 0
+WK = 1
+WK_HUFFMAN = 2
+LZMA = 3
+RAW = 4
+DECISION_NAMES = ["zero", "wk", "wk-huffman-fused", "lzma", "raw"]
+TAG_BYTES = 1
+
+DEFAULT_TARGET_RATIO = 0.5
+# Pages whose bytes carry more information than this are stored raw without trying to compress them
+INCOMPRESSIBLE_ENTROPY_BITS = 7.5
+# Rough size of the code tables of the Huffman coded sections of a page
+HUFFMAN_TABLE_BYTES = 96
+
+# Probe results: the number of words, of zero words and of distinct
+# nonzero words, and the byte entropy in bits per byte of the whole page
+# and of its distinct nonzero words
+Probe = namedtuple("Probe", 'num_words, zero_words, distinct_words, entropy_bits, distinct_entropy_bits')
+
+
+def _entropy_bits(byte_values):
+    """Return the order-0 entropy in bits per byte of an array of bytes"""
+    if len(byte_values) == 0:
+        return 0.0
+    histogram = np.bincount(byte_values, minlength = 256)
+    p = histogram[histogram > 0] / len(byte_values)
+    return float(-(p * np.log2(p)).sum())
+
+
+def probe(page, word_size_bytes = 8):
+    """Measure a page with a few vectorized passes and return a Probe"""
+    page = np.frombuffer(page, dtype = np.uint8)
+    words = page.view(_WORD_DTYPES[word_size_bytes])
+    nonzero = words[words != 0]
+    distinct = np.unique(nonzero)
+    return Probe(len(words), len(words) - len(nonzero), len(distinct), _entropy_bits(page),
+                 _entropy_bits(distinct.view(np.uint8)))
+
+
+class AdaptiveCompressor():
+    """Compresses every page with the cheapest algorithm expected to reach target_ratio"""
+
+    def __init__(self, word_size_bytes = 8, dict_size = 16, num_low_bits = 10, target_ratio = DEFAULT_TARGET_RATIO):
+        if word_size_bytes not in _WORD_DTYPES:
+            raise ValueError("Word size must be one of " + ", ".join(str(size) for size in sorted(_WORD_DTYPES)))
+        self._wk = WKCompressor(word_size_bytes = word_size_bytes, dict_size = dict_size, num_low_bits = num_low_bits)
+        self._wk_huffman = WKHuffmanCompressor(word_size_bytes = word_size_bytes, dict_size = dict_size,
+                                               num_low_bits = num_low_bits)
+        self._word_size_in_bytes = word_size_bytes
+        self._num_dict_index_bits = self._wk._num_dict_index_bits
+        self.target_ratio = target_ratio
+        self.decisions = np.zeros(len(DECISION_NAMES), dtype = np.int64)
+        self.compressed_bytes = np.zeros(len(DECISION_NAMES), dtype = np.int64)
+
+    def predict(self, page_probe):
+        """Return the predicted (wk ratio, wk-huffman ratio) of a probed page
+
+        Every distinct nonzero word is taken to miss once and every repeat
+        to hit, so the WK prediction is optimistic for pages whose
+        repeats are further apart than the dictionary holds. The full
+        words are taken to Huffman code down to their byte entropy.
+        """
+        num_words, zero_words, distinct_words, _, distinct_entropy_bits = page_probe
+        page_size = num_words * self._word_size_in_bytes
+        repeats = num_words - zero_words - distinct_words
+        fixed = HEADER_SIZE_BYTES + num_words / TAGS_PER_PACKED_BYTE + repeats * self._num_dict_index_bits / 8
+        full_words = distinct_words * self._word_size_in_bytes
+        wk = (fixed + full_words) / page_size
+        wk_huffman = (fixed + HUFFMAN_TABLE_BYTES + full_words * distinct_entropy_bits / 8) / page_size
+        return wk, wk_huffman
+
+    def choose(self, page):
+        """Return the decision tag for a page"""
+        page_probe = probe(page, self._word_size_in_bytes)
+        if page_probe.zero_words == page_probe.num_words:
+            return ZERO_PAGE
+        if page_probe.entropy_bits > INCOMPRESSIBLE_ENTROPY_BITS:
+            return RAW
+        wk, wk_huffman = self.predict(page_probe)
+        if wk <= self.target_ratio:
+            return WK
+        elif wk_huffman <= self.target_ratio:
+            return WK_HUFFMAN
+        return LZMA
+
+    def compress(self, page):
+        """Compress a page and return the decision tag followed by the compressed page"""
+        decision = self.choose(page)
+        if decision == ZERO_PAGE:
+            compressed = b""
+        elif decision == WK:
+            compressed = self._wk.compress(page)
+        elif decision == WK_HUFFMAN:
+            compressed = self._wk_huffman.compress(page)
+        elif decision == LZMA:
+            compressed = lzma.compress(page)
+        if decision == RAW or len(compressed) >= len(page):
+            decision = RAW
+            compressed = page
+
+        self.decisions[decision] += 1
+        self.compressed_bytes[decision] += TAG_BYTES + len(compressed)
+        compressed_page = bytearray([decision])
+        compressed_page += compressed
+        return compressed_page
+
+    def decompress(self, compressed_page):
+        """Decompress a page compressed by compress()"""
+        compressed_page = memoryview(compressed_page).cast('B')
+        decision = compressed_page[0]
+        compressed = compressed_page[TAG_BYTES:]
+        if decision == ZERO_PAGE:
+            return bytearray(PAGE_SIZE_BYTES)
+        elif decision == WK:
+            return self._wk.decompress(compressed)
+        elif decision == WK_HUFFMAN:
+            return self._wk_huffman.decompress(compressed)
+        elif decision == LZMA:
+            return bytearray(lzma.decompress(compressed))
+        elif decision == RAW:
+            return bytearray(compressed)
+        raise ValueError("Unknown decision tag " + str(decision))
+
+    def report(self):
+        """Return a printable breakdown of the decisions made so far"""
+        lines = ["decision\tpages\tbytes"]
+        for name, pages, size in zip(DECISION_NAMES, self.decisions.tolist(), self.compressed_bytes.tolist()):
+            lines.append(name + "\t" + str(pages) + "\t" + str(size))
+        return "\n".join(lines)
+
+
+def exhaustive_compress(page, wk, wk_huffman):
+    """Compress a page with every algorithm and return the smallest result in the adaptive format"""
+    candidates = [(WK, wk.compress(page)), (WK_HUFFMAN, wk_huffman.compress(page)), (LZMA, lzma.compress(page)),
+                  (RAW, page)]
+    decision, compressed = min(candidates, key = lambda candidate : len(candidate[1]))
+    compressed_page = bytearray([decision])
+    compressed_page += compressed
+    return compressed_page
+
+
+def compare(pages, word_size_bytes = 8, dict_size = 16, num_low_bits = 10, target_ratio = DEFAULT_TARGET_RATIO):
+    """Compress pages adaptively and by trying every algorithm, and return the adaptive compressor and a row for each"""
+    adaptive = AdaptiveCompressor(word_size_bytes, dict_size, num_low_bits, target_ratio)
+    wk = WKCompressor(word_size_bytes = word_size_bytes, dict_size = dict_size, num_low_bits = num_low_bits)
+    wk_huffman = WKHuffmanCompressor(word_size_bytes = word_size_bytes, dict_size = dict_size,
+                                     num_low_bits = num_low_bits)
+    uncompressed_bytes = sum(len(page) for page in pages)
+
+    rows = list()
+    for name, compress in [("adaptive", adaptive.compress),
+                           ("exhaustive", lambda page : exhaustive_compress(page, wk, wk_huffman))]:
+        start = time.perf_counter()
+        compressed_bytes = sum(len(compress(page)) for page in pages)
+        seconds = time.perf_counter() - start
+        rows.append({"mode" : name,
+                     "ratio" : compressed_bytes / uncompressed_bytes,
+                     "compress_mb_per_s" : uncompressed_bytes / seconds / 1e6})
+    return adaptive, rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compare adaptive algorithm selection with trying every algorithm")
+    parser.add_argument("trace")
+    parser.add_argument("word_size_bytes", type = int, nargs = "?", default = 8)
+    parser.add_argument("dict_size", type = int, nargs = "?", default = 16)
+    parser.add_argument("num_low_bits", type = int, nargs = "?", default = 10)
+    parser.add_argument("--target-ratio", type = float, default = DEFAULT_TARGET_RATIO)
+    parser.add_argument("--pages", type = int, default = 1000, help = "number of pages to compress")
+    args = parser.parse_args()
+
+    pages = list()
+    for page in trace_reader.read_pages(args.trace):
+        if len(pages) == args.pages:
+            break
+        pages.append(bytes(page.data))
+
+    adaptive, rows = compare(pages, args.word_size_bytes, args.dict_size, args.num_low_bits, args.target_ratio)
+    print(adaptive.report())
+    print()
+    print("mode\tratio\tcompress MB/s")
+    for row in rows:
+        print(row["mode"], "{0:.4f}".format(row["ratio"]), "{0:.2f}".format(row["compress_mb_per_s"]), sep = "\t")
+    print("speedup\t" + "{0:.2f}".format(rows[0]["compress_mb_per_s"] / rows[1]["compress_mb_per_s"]))
@@ -0,0 +1,200 @@
+'''
+Created on Oct 16, 2026
+
+Benchmark suite for the compressors. Every codec compresses and
+decompresses the same reproducible corpus of pages, made of synthetic
+pages like those in testing.py and optionally pages sampled from a real
+trace, and reports throughput, per-page latency percentiles, compression
+ratio and peak memory. Results are saved as JSON so that later runs can
+be compared against a baseline.
+'''
+
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+import lzma, zlib, bz2
+import numpy as np
+from wk import WKCompressor, PAGE_SIZE_BYTES
+from wk_huffman import WKHuffmanCompressor
+import huffman
+import trace_reader
+
+# (word_size_bytes, dict_size, num_low_bits) of the WK configurations benchmarked
+WK_CONFIGS = [(4, 16, 10), (8, 16, 10), (4, 256, 10), (8, 1024, 16)]
+# Hashed dictionary associativities benchmarked alongside the LRU dictionary of every WK configuration
+WK_ASSOCIATIVITIES = [1, 4]
+MEMORY_PAGES = 16
+
+
+def _words_page(words, word_size_bytes):
+    return b"".join(word.to_bytes(word_size_bytes, byteorder = "big") for word in words)
+
+
+# Generators of synthetic pages, each taking a seeded random.Random
+SYNTHETIC_GENERATORS = {
+    "zero" : lambda rand : bytes(PAGE_SIZE_BYTES),
+    "patterns64" : lambda rand : _words_page([rand.choice([0x61083282abedbf10, 0xcccccccc55555555, 0x1234abcdf5ba03e7,
+                                                           0x1234abcdf5ba0132, 0]) for _ in range(512)], 8),
+    "sequential32" : lambda rand : _words_page([2 * (i + rand.randrange(1024)) for i in range(1024)], 4),
+    "small32" : lambda rand : _words_page([rand.randint(0, 1024) for _ in range(1024)], 4),
+    "pointers64" : lambda rand : _words_page([0x7f0000000000 + rand.randrange(1 << 20) * 8 if rand.random() < 0.6 else 0
+                                              for _ in range(512)], 8),
+    "random64" : lambda rand : _words_page([rand.randint(1, 10000000) for _ in range(512)], 8),
+    "random_bytes" : lambda rand : bytes(rand.getrandbits(8) for _ in range(PAGE_SIZE_BYTES)),
+}
+
+
+def synthetic_corpus(pages_per_generator = 32, seed = 7):
+    """Return a list of (source, page) with pages_per_generator pages from every synthetic generator"""
+    rand = random.Random(seed)
+    return [(name, generator(rand)) for name, generator in sorted(SYNTHETIC_GENERATORS.items())
+            for _ in range(pages_per_generator)]
+
+
+def trace_corpus(trace, num_pages, seed = 7):
+    """Return a list of (source, page) with num_pages pages sampled uniformly from a trace"""
+    rand = random.Random(seed)
+    sample = list()
+    for page in trace_reader.read_pages(trace):
+        if len(sample) < num_pages:
+            sample.append((page.index, bytes(page.data)))
+        else:
+            replace = rand.randrange(page.index + 1)
+            if replace < num_pages:
+                sample[replace] = (page.index, bytes(page.data))
+    sample.sort()
+    return [("trace", page) for _, page in sample]
+
+
+def codecs():
+    """Return a list of (name, compress, decompress) for every codec benchmarked"""
+    result = list()
+    for word_size_bytes, dict_size, num_low_bits in WK_CONFIGS:
+        wk = WKCompressor(word_size_bytes = word_size_bytes, dict_size = dict_size, num_low_bits = num_low_bits)
+        suffix = "-" + "-".join(str(n) for n in (word_size_bytes * 8, dict_size, num_low_bits))
+        result.append(("wk" + suffix, wk.compress, wk.decompress))
+        for associativity in WK_ASSOCIATIVITIES:
+            wk = WKCompressor(word_size_bytes = word_size_bytes, dict_size = dict_size, num_low_bits = num_low_bits,
+                              associativity = associativity)
+            result.append(("wk-" + str(associativity) + "way" + suffix, wk.compress, wk.decompress))
+    wk = WKCompressor(word_size_bytes = 8, dict_size = 16, num_low_bits = 10)
+    result.append(("wk-huffman-64-16-10", lambda page, wk = wk : huffman.compress(wk.compress(page)),
+                   lambda compressed, wk = wk : wk.decompress(huffman.decompress(compressed))))
+    fused = WKHuffmanCompressor(word_size_bytes = 8, dict_size = 16, num_low_bits = 10)
+    result.append(("wk-huffman-fused-64-16-10", fused.compress, fused.decompress))
+    result.append(("lzma", lzma.compress, lzma.decompress))
+    result.append(("bz2", bz2.compress, bz2.decompress))
+    result.append(("zlib", lambda page : zlib.compress(page, 9), zlib.decompress))
+    return result
+
+
+def _peak_memory(compress, decompress, pages):
+    """Return the peak bytes allocated by Python while compressing and decompressing pages"""
+    tracemalloc.start()
+    try:
+        for page in pages:
+            decompress(compress(page))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(corpus, codec_list = None):
+    """Benchmark every codec on a corpus of (source, page) and return a result row for each"""
+    pages = [page for _, page in corpus]
+    uncompressed_bytes = sum(len(page) for page in pages)
+    rows = list()
+    for name, compress, decompress in codec_list or codecs():
+        compress_ns = np.zeros(len(pages), dtype = np.int64)
+        decompress_ns = np.zeros(len(pages), dtype = np.int64)
+        compressed_bytes = 0
+        for n, page in enumerate(pages):
+            start = time.perf_counter_ns()
+            compressed = compress(page)
+            compress_ns[n] = time.perf_counter_ns() - start
+            start = time.perf_counter_ns()
+            uncompressed = decompress(compressed)
+            decompress_ns[n] = time.perf_counter_ns() - start
+            if uncompressed != page:
+                raise AssertionError(name + " did not reproduce page " + str(n) + " (" + corpus[n][0] + ")")
+            compressed_bytes += len(compressed)
+
+        rows.append({"codec" : name,
+                     "pages" : len(pages),
+                     "ratio" : compressed_bytes / uncompressed_bytes,
+                     "compress_mb_per_s" : uncompressed_bytes / compress_ns.sum() * 1e3,
+                     "decompress_mb_per_s" : uncompressed_bytes / decompress_ns.sum() * 1e3,
+                     "compress_p50_us" : np.percentile(compress_ns, 50) / 1e3,
+                     "compress_p99_us" : np.percentile(compress_ns, 99) / 1e3,
+                     "decompress_p50_us" : np.percentile(decompress_ns, 50) / 1e3,
+                     "decompress_p99_us" : np.percentile(decompress_ns, 99) / 1e3,
+                     "peak_memory_bytes" : _peak_memory(compress, decompress, pages[:MEMORY_PAGES])})
+    return rows
+
+
+def compare(rows, baseline_rows):
+    """Return (codec, field, baseline, current, change) for every shared measurement"""
+    baseline = {row["codec"] : row for row in baseline_rows}
+    changes = list()
+    for row in rows:
+        if row["codec"] not in baseline:
+            continue
+        for field, value in row.items():
+            if field in ("codec", "pages"):
+                continue
+            base_value = baseline[row["codec"]].get(field)
+            if base_value:
+                changes.append((row["codec"], field, base_value, value, value / base_value - 1))
+    return changes
+
+
+def print_rows(rows, out = sys.stdout):
+    fields = [field for field in rows[0] if field != "codec"]
+    out.write("codec".ljust(28) + "".join(field.rjust(20) for field in fields) + "\n")
+    for row in rows:
+        out.write(row["codec"].ljust(28) + "".join("{0:.4g}".format(row[field]).rjust(20) for field in fields) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the compressors on a reproducible page corpus")
+    parser.add_argument("--trace", default = None, help = "trace to sample real pages from")
+    parser.add_argument("--trace-pages", type = int, default = 256)
+    parser.add_argument("--synthetic-pages", type = int, default = 32, help = "pages per synthetic generator")
+    parser.add_argument("--seed", type = int, default = 7)
+    parser.add_argument("--codecs", nargs = "+", default = None, help = "only run the named codecs")
+    parser.add_argument("--out", default = None, help = "JSON file to save the results to")
+    parser.add_argument("--baseline", default = None, help = "JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.synthetic_pages, args.seed)
+    if args.trace is not None:
+        corpus += trace_corpus(args.trace, args.trace_pages, args.seed)
+    codec_list = [codec for codec in codecs() if args.codecs is None or codec[0] in args.codecs]
+
+    rows = benchmark(corpus, codec_list)
+    print_rows(rows)
+
+    if args.out is not None:
+        with open(args.out, 'w') as out:
+            json.dump({"python" : platform.python_version(),
+                       "machine" : platform.platform(),
+                       "processor" : platform.processor(),
+                       "seed" : args.seed,
+                       "trace" : args.trace,
+                       "corpus_pages" : len(corpus),
+                       "results" : rows}, out, indent = 2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        if (baseline["seed"], baseline["trace"], baseline["corpus_pages"]) != (args.seed, args.trace, len(corpus)):
+            print("Warning: the baseline was run on a different corpus")
+        baseline_rows = baseline["results"]
+        for codec, field, base_value, value, change in compare(rows, baseline_rows):
+            print(codec.ljust(28), field.ljust(22), "{0:.4g}".format(base_value).rjust(12),
+                  "{0:.4g}".format(value).rjust(12), "{0:+.1%}".format(change).rjust(10))
@@ -0,0 +1,73 @@
+'''
+Created on Oct 16, 2026
+
+Vectorized packing and unpacking of fixed-width bit fields into big-endian
+packing words. The layout matches the one written by WKCompressor: each
+packing word holds as many fields as fit, the first field in the most
+significant bits, with any leftover low bits and any trailing fields of
+the last word left as zero.
+'''
+
+import numpy as np
+
+BITS_PER_BYTE = 8
+
+# Big-endian NumPy dtypes for the supported packing word sizes
+_PACKING_DTYPES = {1 : np.dtype('>u1'), 2 : np.dtype('>u2'),
+                   4 : np.dtype('>u4'), 8 : np.dtype('>u8')}
+
+
+def _layout(data_size, packing_word_bytes):
+    """Return the dtype, fields per packing word and per-field shifts of a layout"""
+    try:
+        dtype = _PACKING_DTYPES[packing_word_bytes]
+    except KeyError:
+        raise ValueError("Packing word size must be one of 1, 2, 4 or 8 bytes")
+    packing_bits = packing_word_bytes * BITS_PER_BYTE
+    if not 1 <= data_size <= packing_bits:
+        raise ValueError("Data size must be between 1 and " + str(packing_bits) + " bits")
+
+    reps = packing_bits // data_size
+    shifts = (packing_bits - data_size * np.arange(1, reps + 1)).astype(np.uint64)
+    return dtype, reps, shifts
+
+
+def packed_size(num_values, data_size, packing_word_bytes = 8):
+    """Return the number of bytes pack() produces for num_values fields"""
+    reps = (packing_word_bytes * BITS_PER_BYTE) // data_size
+    return -(-num_values // reps) * packing_word_bytes
+
+
+def pack(values, data_size, packing_word_bytes = 8):
+    """Pack an array of data_size-bit values into big-endian packing words
+
+    Returns the packed words as a NumPy array of the big-endian packing
+    dtype; call tobytes() on it for the raw packed bytes.
+    """
+    dtype, reps, shifts = _layout(data_size, packing_word_bytes)
+    values = np.asarray(values, dtype = np.uint64)
+    num_words = -(-len(values) // reps)
+
+    # Pad the last packing word with zero fields and lay the values out one
+    # packing word per row so that a single OR-reduction builds every word
+    fields = np.zeros(num_words * reps, dtype = np.uint64)
+    fields[:len(values)] = values
+    fields = fields.reshape(num_words, reps) << shifts
+    return np.bitwise_or.reduce(fields, axis = 1).astype(dtype)
+
+
+def unpack(packed, data_size, packing_word_bytes = 8):
+    """Extract every data_size-bit field from a buffer of packed words
+
+    The buffer may be any bytes-like object or an array of packing words.
+    Trailing padding fields of the last packing word are included, so the
+    caller is responsible for knowing how many values are meaningful.
+    """
+    dtype, reps, shifts = _layout(data_size, packing_word_bytes)
+    if isinstance(packed, np.ndarray):
+        words = packed.astype(np.uint64)
+    else:
+        words = np.frombuffer(packed, dtype = dtype).astype(np.uint64)
+    mask = np.uint64((1 << data_size) - 1)
+    fields = (words[:, np.newaxis] >> shifts) & mask
+    return fields.reshape(-1).astype(np.uint32 if data_size <= 32 else np.uint64)
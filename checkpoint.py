@@ -0,0 +1,119 @@
+'''
+Created on Oct 16, 2026
+
+Checkpointed results of a run over a trace, so that a preempted job can
+pick up where it stopped instead of starting the trace again. Each page's
+result is appended to a results file in the format of results.py, in
+chunks of a fixed number of pages. After each chunk the file is synced
+and a small JSON state file recording how many pages are done is
+replaced atomically. On restart the results file is cut back to the
+recorded number of pages, so a chunk that was only partly written is
+redone, and the run resumes at the first page of the next chunk.
+'''
+
+import os
+import json
+import trace_reader
+import results
+
+STATE_SUFFIX = ".state"
+DEFAULT_CHUNK_PAGES = 16384
+
+
+def _write_json_atomically(path, state):
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, indent = 2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _results_config(trace, config):
+    return dict(config, trace = os.path.abspath(trace), trace_bytes = os.path.getsize(trace))
+
+
+def write_complete(path, trace, config, records):
+    """Write the results records of a whole run as a finished checkpointed run, as if CheckpointedResults had"""
+    with open(path, 'wb') as f:
+        f.write(results.preamble(_results_config(trace, config)))
+        f.write(records.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    _write_json_atomically(path + STATE_SUFFIX, {"pages_done" : len(records), "complete" : True})
+
+
+class CheckpointedResults():
+    """Collects the per-page results of a run and checkpoints them every chunk_pages pages
+
+    config describes the run, such as the algorithm and its parameters,
+    and is embedded in the results file together with the trace.
+    Reopening the results of a run with a different trace or config
+    raises ValueError rather than mixing the results of two runs.
+    """
+
+    def __init__(self, path, trace, config, chunk_pages = DEFAULT_CHUNK_PAGES):
+        self.path = path
+        self._state_path = path + STATE_SUFFIX
+        self._chunk_pages = chunk_pages
+        self._pending_sizes = list()
+        self._pending_headers = list()
+        self.config = _results_config(trace, config)
+
+        self.pages_done = 0
+        self.complete = False
+        if os.path.exists(self._state_path) and os.path.exists(path):
+            with open(path, 'rb') as f:
+                existing_config, preamble_size = results.read_preamble(f)
+            if existing_config != self.config:
+                raise ValueError("Results file " + path + " belongs to a different trace or configuration")
+            with open(self._state_path) as f:
+                state = json.load(f)
+            self.pages_done = state["pages_done"]
+            self.complete = state["complete"]
+        else:
+            preamble = results.preamble(self.config)
+            preamble_size = len(preamble)
+            with open(path, 'wb') as f:
+                f.write(preamble)
+            self._checkpoint()
+
+        # Drop any chunk written after the last checkpoint
+        with open(path, 'r+b') as f:
+            f.truncate(preamble_size + self.pages_done * results.RESULT_DTYPE.itemsize)
+        self._results = open(path, 'ab')
+
+    @property
+    def start_offset(self):
+        """Byte offset into the uncompressed trace of the first page still to be done"""
+        return self.pages_done * trace_reader.RECORD_SIZE_BYTES
+
+    def add(self, sizes, headers):
+        """Add the sizes and trace headers of the next pages, checkpointing every time a chunk fills up"""
+        self._pending_sizes.extend(sizes)
+        self._pending_headers.extend(headers)
+        while len(self._pending_sizes) >= self._chunk_pages:
+            self._write(self._pending_sizes[:self._chunk_pages], self._pending_headers[:self._chunk_pages])
+            del self._pending_sizes[:self._chunk_pages]
+            del self._pending_headers[:self._chunk_pages]
+
+    def _write(self, sizes, headers):
+        self._results.write(results.to_records(sizes, headers).tobytes())
+        self._results.flush()
+        os.fsync(self._results.fileno())
+        self.pages_done += len(sizes)
+        self._checkpoint()
+
+    def _checkpoint(self):
+        _write_json_atomically(self._state_path, {"pages_done" : self.pages_done, "complete" : self.complete})
+
+    def close(self, complete = True):
+        """Checkpoint the pages still pending and, if complete, mark the run finished"""
+        if self._pending_sizes:
+            self._write(self._pending_sizes, self._pending_headers)
+            self._pending_sizes = list()
+            self._pending_headers = list()
+        if complete:
+            self.complete = True
+            self._checkpoint()
+        self._results.close()
@@ -1,69 +1,238 @@
 import sys
-import queue
-import threading
-import struct
-from wk import WKCompressor
+import os
+import argparse
+import collections
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from wk import WKCompressor, WKStats, PAGE_SIZE_BYTES
+from wk_huffman import WKHuffmanCompressor
+from adaptive import AdaptiveCompressor
+from trace_reader import RECORD_HEADER_BYTES, RECORD_SIZE_BYTES
+import trace_reader
 import huffman
+import dedup
+from checkpoint import CheckpointedResults, DEFAULT_CHUNK_PAGES
+import checkpoint
+from result_cache import ResultCache, DEFAULT_MAX_BYTES
 import lzma
 import bz2
 
-def page_reader(trace):
-    with open(trace, 'rb') as f:
-        count = 0
-        while count < 20:   
-            try:
-                page = f.read(4104)
-                page = page[8:]
-                q.put(page)
-                count += 1
-            except:
-                q.put(None)  
-                break
-        q.put(None)
-    return
-
-def compressor(algorithm, wk_compressor = None):
-    while True:
-        if not q.empty():
-            page = q.get()
-            if page is None:
-                break
-            
-            if algorithm == "wk":
-                compressed = wk_compressor.compress(page)
-            elif algorithm == "wk-huffman":
-                wk_compressed = wk_compressor.compress(page)
-                compressed = huffman.compress(wk_compressed)
-            elif algorithm == "lzma":
-                compressed = lzma.compress(page)
-            elif algorithm == "bzip":
-                compressed = bz2.compress(page)
-            else:
-                print("Please enter one of 'wk', 'wk-huffman', 'lzma', or 'bzip'")
-                exit()
-            compressed_size = len(compressed)
-            #compressed_size_bytes = struct.pack(">I", compressed_size)
-            out.write(str(compressed_size) + "\n")
+ALGORITHMS = ["wk", "wk-huffman", "wk-huffman-shared", "wk-huffman-fused", "adaptive", "lzma", "bzip"]
+# Pages between retraining the Huffman table for 'wk-huffman-shared'
+SHARED_TABLE_REFRESH_PAGES = 64
+DEFAULT_BATCH_SIZE = 256
+
+# Per-process state set up by _init_worker so that each worker
+# process builds its compressor once rather than once per batch
+_algorithm = None
+_wk_compressor = None
+
+
+def read_batches(trace, batch_size, start = 0):
+    """Yield buffers of up to batch_size whole page records read from a trace, from byte offset start on"""
+    for _, records in trace_reader.read_chunks(trace, start, chunk_records = batch_size):
+        yield bytes(records)
+
+
+def compress_page(algorithm, page, wk_compressor = None, huffman_tables = None):
+    """Compress a single page with the named algorithm"""
+    if algorithm == "wk":
+        return wk_compressor.compress(page)
+    elif algorithm == "wk-huffman":
+        wk_compressed = wk_compressor.compress(page)
+        return huffman.compress(wk_compressed)
+    elif algorithm == "wk-huffman-shared":
+        wk_compressed = wk_compressor.compress(page)
+        return huffman_tables.compress(wk_compressed)
+    elif algorithm == "wk-huffman-fused" or algorithm == "adaptive":
+        # wk_compressor is a WKHuffmanCompressor or an AdaptiveCompressor for these algorithms
+        return wk_compressor.compress(page)
+    elif algorithm == "lzma":
+        return lzma.compress(page)
+    elif algorithm == "bzip":
+        return bz2.compress(page)
+    raise ValueError("Algorithm must be one of " + ", ".join(ALGORITHMS))
+
+
+def _init_worker(algorithm, wk_args, collect_stats = False):
+    global _algorithm, _wk_compressor
+    _algorithm = algorithm
+    if algorithm == "wk-huffman-fused":
+        _wk_compressor = WKHuffmanCompressor(**wk_args)
+    elif algorithm == "adaptive":
+        _wk_compressor = AdaptiveCompressor(**wk_args)
+    elif "wk" in algorithm:
+        _wk_compressor = WKCompressor(**wk_args)
+        if collect_stats:
+            _wk_compressor.stats = WKStats(_wk_compressor._dict_size)
+    else:
+        _wk_compressor = None
+
+
+def compress_batch(batch):
+    """Return the compressed size of every page record in a batch, and the WKStats of the batch if collected"""
+    records = np.frombuffer(batch, dtype = np.uint8).reshape(-1, RECORD_SIZE_BYTES)
+    pages = records[:, RECORD_HEADER_BYTES:]
+    stats = getattr(_wk_compressor, "stats", None)
+    if stats is not None:
+        _wk_compressor.stats = WKStats(_wk_compressor._dict_size)
+    if _algorithm == "wk":
+        # Only the size is recorded, so it is computed without building the page
+        sizes = [_wk_compressor.estimate(page).total for page in pages]
+    else:
+        # Shared Huffman tables start afresh with every batch so that results do 
+        # not depend on which worker happened to compress the earlier batches
+        huffman_tables = huffman.SharedTables(refresh_pages = SHARED_TABLE_REFRESH_PAGES)
+        sizes = list()
+        for page in pages:
+            table_bytes = huffman_tables.table_bytes
+            compressed_size = len(compress_page(_algorithm, page.tobytes(), _wk_compressor, huffman_tables))
+            # A shared table is charged to the page it was trained for, so that the 
+            # sizes of a run add up to all the bytes a decoder needs
+            sizes.append(compressed_size + huffman_tables.table_bytes - table_bytes)
+    return sizes, getattr(_wk_compressor, "stats", None)
+
+
+def dedup_batch(batch, stage):
+    """Check every record of a batch with a DedupStage and return the kinds and a batch of the records to compress"""
+    records = np.frombuffer(batch, dtype = np.uint8).reshape(-1, RECORD_SIZE_BYTES)
+    kinds = [stage.check(page)[0] for page in records[:, RECORD_HEADER_BYTES:]]
+    keep = [n for n, kind in enumerate(kinds) if kind == dedup.COMPRESSED]
+    return kinds, records[keep].tobytes()
+
+
+def run(trace, algorithm, wk_args = None, workers = None, batch_size = DEFAULT_BATCH_SIZE, out = sys.stdout, stats = None,
+        dedup_stage = None, results = None):
+    """Compress every page of a trace across a pool of worker processes
+
+    Batches are handed out to the workers as they are read and their
+    results written in trace order. At most two batches per worker are
+    in flight at once, which bounds memory regardless of the trace size.
+    If stats is a WKStats, the WK statistics of every batch are merged 
+    into it. If dedup_stage is a DedupStage, it checks every page in 
+    trace order before the batch is handed out, only the pages it does
+    not short-circuit are compressed, and the sizes written are those 
+    of the dedup.DedupCompressor format. If results is a 
+    CheckpointedResults, the sizes are added to it instead of being 
+    written to out, and the run starts from its last checkpoint.
+    """
+    workers = workers or os.cpu_count()
+    start = 0
+    if results is not None:
+        if results.complete:
+            return
+        start = results.start_offset
+        out = results
+    with ProcessPoolExecutor(max_workers = workers, initializer = _init_worker,
+                             initargs = (algorithm, wk_args or {}, stats is not None)) as pool:
+        pending = collections.deque()
+        for batch in read_batches(trace, batch_size, start):
+            kinds = None
+            headers = None
+            if results is not None:
+                headers = np.frombuffer(batch, dtype = np.uint8).reshape(-1, RECORD_SIZE_BYTES)
+                headers = headers[:, :RECORD_HEADER_BYTES].copy().view('>u8').ravel()
+            if dedup_stage is not None:
+                kinds, batch = dedup_batch(batch, dedup_stage)
+            pending.append((pool.submit(compress_batch, batch), kinds, headers))
+            if len(pending) >= 2 * workers:
+                _write_sizes(*pending.popleft(), out, stats)
+        while pending:
+            _write_sizes(*pending.popleft(), out, stats)
+
+
+def _write_sizes(future, kinds, headers, out, stats = None):
+    sizes, batch_stats = future.result()
+    if kinds is not None:
+        sizes = iter(sizes)
+        sizes = [dedup.encoded_size(kind, next(sizes) if kind == dedup.COMPRESSED else 0) for kind in kinds]
+    if isinstance(out, CheckpointedResults):
+        out.add(sizes, headers)
+    else:
+        out.write("".join(str(compressed_size) + "\n" for compressed_size in sizes))
+    if stats is not None and batch_stats is not None:
+        stats.merge(batch_stats)
+
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Compress every page of a memory trace and print each compressed size")
+    parser.add_argument("trace")
+    parser.add_argument("algorithm", choices = ALGORITHMS)
+    parser.add_argument("word_size_bytes", type = int, nargs = "?", default = 8)
+    parser.add_argument("dict_size", type = int, nargs = "?", default = 16)
+    parser.add_argument("num_low_bits", type = int, nargs = "?", default = 10)
+    parser.add_argument("--workers", type = int, default = None,
+                        help = "number of worker processes (default: one per core)")
+    parser.add_argument("--batch-size", type = int, default = DEFAULT_BATCH_SIZE,
+                        help = "number of pages handed to a worker at a time")
+    parser.add_argument("--stats", action = "store_true",
+                        help = "print WK tag, section, dict index and timing statistics to stderr (not wk-huffman-fused or adaptive)")
+    parser.add_argument("--dedup-cache", type = int, default = 0,
+                        help = "short-circuit zero pages and repeats of the last DEDUP_CACHE distinct pages (default: off)")
+    parser.add_argument("--checkpoint", default = None, metavar = "RESULTS",
+                        help = "write the sizes and page headers to the binary results file RESULTS, "
+                               "checkpointing so that a rerun resumes")
+    parser.add_argument("--chunk-pages", type = int, default = DEFAULT_CHUNK_PAGES,
+                        help = "number of pages between checkpoints")
+    parser.add_argument("--cache", default = None, metavar = "DIR",
+                        help = "take the results from the result cache in DIR if this run was done before, "
+                               "and add them to it otherwise")
+    parser.add_argument("--cache-max-bytes", type = int, default = DEFAULT_MAX_BYTES,
+                        help = "evict the least recently used results once the cache grows beyond this")
+    args = parser.parse_args(argv)
+    if args.checkpoint is not None and args.chunk_pages % args.batch_size != 0:
+        # Shared Huffman tables restart with every batch, so a resumed run 
+        # must cut its batches in the same places
+        parser.error("--chunk-pages must be a multiple of --batch-size")
+    if args.checkpoint is not None and args.dedup_cache > 0:
+        # The dedup cache is not saved, so a resumed run would size pages differently
+        parser.error("--dedup-cache cannot be combined with --checkpoint")
+    if args.cache is not None and args.checkpoint is None:
+        parser.error("--cache needs --checkpoint")
+    return args
+
+
+def run_config(args):
+    """Return the configuration of a run recorded with its results"""
+    return {'word_size_bytes': args.word_size_bytes, 'dict_size': args.dict_size, 'num_low_bits': args.num_low_bits,
+            'algorithm': args.algorithm, 'page_size_bytes': PAGE_SIZE_BYTES}
+
+
+def cache_key(cache, args):
+    """Return the key of a run in a ResultCache"""
+    config = run_config(args)
+    if args.algorithm == "wk-huffman-shared":
+        # Shared Huffman tables restart with every batch, so only for them does the batch size change the sizes
+        config["batch_size"] = args.batch_size
+    return cache.key(cache.trace_hash(args.trace), config)
+
 
 if __name__ == '__main__':
-    q = queue.Queue()
-    #outfile = "compression-ratio.txt"
-    #out = open(outfile, "w+")
-    out = sys.stdout
-    
-    trace = sys.argv[1]
-    producer = threading.Thread(target= page_reader, args = (trace,))
-    
-    algorithm = sys.argv[2]
-    if "wk" in algorithm:
-        wk = WKCompressor(word_size_bytes=int(sys.argv[3]), dict_size= int(sys.argv[4]), num_low_bits=int(sys.argv[5]))
+    args = parse_args()
+    wk_args = {'word_size_bytes': args.word_size_bytes, 'dict_size': args.dict_size,
+               'num_low_bits': args.num_low_bits}
+    stats = WKStats(args.dict_size) if args.stats else None
+    dedup_stage = dedup.DedupStage(args.dedup_cache) if args.dedup_cache > 0 else None
+    results = None
+    cache = None
+    cached_records = None
+    if args.cache is not None:
+        cache = ResultCache(args.cache, args.cache_max_bytes)
+        key = cache_key(cache, args)
+        cached_records = cache.get(key)
+    if cached_records is not None:
+        checkpoint.write_complete(args.checkpoint, args.trace, run_config(args), cached_records)
+        print("Results of " + str(len(cached_records)) + " pages taken from the result cache", file = sys.stderr)
     else:
-        wk = None           
-    consumer = threading.Thread(target= compressor, args = (algorithm,), kwargs = {'wk_compressor': wk})
-    
-    producer.start()
-    consumer.start()
-   
-    producer.join()
-    consumer.join()
-    #out.close()
+        if args.checkpoint is not None:
+            results = CheckpointedResults(args.checkpoint, args.trace, run_config(args), args.chunk_pages)
+        run(args.trace, args.algorithm, wk_args, workers = args.workers, batch_size = args.batch_size, stats = stats,
+            dedup_stage = dedup_stage, results = results)
+        if results is not None:
+            results.close()
+        if cache is not None:
+            cache.put(key, args.checkpoint)
+    if stats is not None:
+        print(stats.report(), file = sys.stderr)
+    if dedup_stage is not None:
+        print(dedup_stage.report(), file = sys.stderr)
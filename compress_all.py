@@ -1,12 +1,48 @@
 import os
 import sys
 import subprocess
+from sweep import WORD_SIZES_BITS, DICT_SIZES, LOW_BITS, WK_ALGORITHMS
+from result_cache import ResultCache
+import cluster_tester
+import checkpoint
 
 trace = sys.argv[1]
 script = "compress-one.sh"
 base_dir = os.getcwd()
 results_base_dir = os.path.join(base_dir, "results")
 
+# In sweep mode a single job decodes the trace once and evaluates the
+# whole grid with sweep.py instead of one job per configuration
+if "--sweep" in sys.argv[2:]:
+    if not os.path.exists(results_base_dir):
+        os.makedirs(results_base_dir, mode = 755)
+    cmd_file = "sweep.cmd"
+    f = open(cmd_file, 'w+')
+    f.write("universe = vanilla\n")
+    f.write("notification = never\n")
+    f.write("getenv = true\n")
+    f.write("initialdir = " + base_dir + "\n")
+    f.write("priority = 5\n")
+    f.write("executable = " + sys.executable + "\n")
+    f.write("request_cpus = 32\n")
+    f.write("\n")
+    f.write("log = " + os.path.join(results_base_dir, "sweep-log.txt\n"))
+    f.write("error = " + os.path.join(results_base_dir, "sweep-err.txt\n"))
+    f.write("arguments = sweep.py " + trace + " --workers 32 --out " + os.path.join(results_base_dir, "sweep.csv\n"))
+    f.write("queue\n\n")
+    f.close()
+    subprocess.run(["condor_submit",os.path.join(base_dir, cmd_file)])
+    sys.exit()
+
+# Each job checkpoints its results into results.bin, so a preempted job that
+# Condor reruns resumes from its last checkpoint. With --cache DIR, runs found
+# in the result cache are filled in straight away and only the missing ones 
+# are scheduled, and every job adds its results to the cache when it finishes
+cache = None
+if "--cache" in sys.argv[2:]:
+    cache_dir = os.path.abspath(sys.argv[sys.argv.index("--cache") + 1])
+    cache = ResultCache(cache_dir)
+
 cmd_file = "compress.cmd"
 f = open(cmd_file, 'w+')
 f.write("universe = vanilla\n")
@@ -17,40 +53,39 @@ f.write("priority = 5\n")
 f.write("executable = " + script + "\n")
 f.write("\n")
 
-for word_size_bits in [32,64]:
-    for dict_size in [2**n for n in range(1,11)]:
-        for low_bits in range(4,17):
-            for algorithm in ["wk", "wk-huffman"]:
-                results_dir = os.path.join(results_base_dir, algorithm, str(word_size_bits), str(dict_size), str(low_bits))
-                if not os.path.exists(results_dir):
-                    os.makedirs(results_dir, mode = 755)
-                
-                f.write("log = " + os.path.join(results_dir, "log.txt\n"))
-                f.write("output = " + os.path.join(results_dir, "out.txt\n"))
-                f.write("error = " + os.path.join(results_dir, "err.txt\n"))
-                f.write("arguments = " + trace + " " + algorithm + " " + str(word_size_bits//8) + " " + str(dict_size) + " " + str(low_bits) +"\n")
-                f.write("queue\n\n")  
-                
-results_lzma = os.path.join(results_base_dir, "lzma")
-if not os.path.exists(results_lzma):
-    os.makedirs(results_lzma, mode = 755)
-f.write("log = " + os.path.join(results_lzma, "log.txt\n"))
-f.write("output = " + os.path.join(results_lzma, "out.txt\n"))
-f.write("error = " + os.path.join(results_lzma, "err.txt\n"))
-f.write("arguments = " + trace + " lzma\n")
-f.write("queue\n\n") 
-
-results_bzip = os.path.join(results_base_dir, "bzip")
-if not os.path.exists(results_bzip):
-    os.makedirs(results_bzip, mode = 755)
-f.write("log = " + os.path.join(results_bzip, "log.txt\n"))
-f.write("output = " + os.path.join(results_bzip, "out.txt\n"))
-f.write("error = " + os.path.join(results_bzip, "err.txt\n"))
-f.write("arguments = " + trace + " bzip\n")
-f.write("queue\n\n") 
+jobs = list()
+for word_size_bits in WORD_SIZES_BITS:
+    for dict_size in DICT_SIZES:
+        for low_bits in LOW_BITS:
+            for algorithm in WK_ALGORITHMS:
+                jobs.append((os.path.join(results_base_dir, algorithm, str(word_size_bits), str(dict_size), str(low_bits)),
+                             [algorithm, str(word_size_bits//8), str(dict_size), str(low_bits)]))
+jobs.append((os.path.join(results_base_dir, "lzma"), ["lzma"]))
+jobs.append((os.path.join(results_base_dir, "bzip"), ["bzip"]))
+
+num_cached = 0
+for results_dir, job_args in jobs:
+    if not os.path.exists(results_dir):
+        os.makedirs(results_dir, mode = 755)
+    job_args = [trace] + job_args + ["--checkpoint", os.path.join(results_dir, "results.bin")]
+    if cache is not None:
+        args = cluster_tester.parse_args(job_args)
+        records = cache.get(cluster_tester.cache_key(cache, args))
+        if records is not None:
+            checkpoint.write_complete(args.checkpoint, trace, cluster_tester.run_config(args), records)
+            num_cached += 1
+            continue
+        job_args += ["--cache", cache_dir]
+
+    f.write("log = " + os.path.join(results_dir, "log.txt\n"))
+    f.write("output = " + os.path.join(results_dir, "out.txt\n"))
+    f.write("error = " + os.path.join(results_dir, "err.txt\n"))
+    f.write("arguments = " + " ".join(job_args) + "\n")
+    f.write("queue\n\n")
 
 f.close()
 
+print(str(num_cached) + " of " + str(len(jobs)) + " runs taken from the result cache")
 subprocess.run(["chmod","755", "results", "-R"])
-subprocess.run(["condor_submit",os.path.join(base_dir, cmd_file)])
-                
\ No newline at end of file
+if num_cached < len(jobs):
+    subprocess.run(["condor_submit",os.path.join(base_dir, cmd_file)])
@@ -0,0 +1,146 @@
+'''
+Created on Oct 16, 2026
+
+Front stage for the compressors that short-circuits all-zero pages and
+exact repeats of recently seen pages. Zero pages are found with one
+vectorized check. Repeats are found by a content hash looked up in a
+bounded cache of recent pages with LRU eviction. Either kind of page is
+then encoded as a tiny reference instead of being compressed.
+
+Every page starts with a one byte kind. A zero page is just the kind.
+A duplicate is the kind and a 4 byte reference to the earlier page.
+Any other page is the kind followed by its compressed form. The
+decoder repeats exactly the cache updates of the encoder, so a
+reference names the same page on both sides without any hashing on
+decode.
+'''
+
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from wk import PAGE_SIZE_BYTES
+
+COMPRESSED = 0
+ZERO_PAGE = 1
+DUPLICATE = 2
+KIND_BYTES = 1
+REFERENCE_BYTES = 4
+DIGEST_BYTES = 16
+DEFAULT_CACHE_PAGES = 4096
+
+
+def is_zero_page(page):
+    """Return True if every byte of a bytes-like page is zero"""
+    page = memoryview(page).cast('B')
+    dtype = np.uint64 if len(page) % 8 == 0 else np.uint8
+    return not np.frombuffer(page, dtype = dtype).any()
+
+
+def page_digest(page):
+    return hashlib.blake2b(page, digest_size = DIGEST_BYTES).digest()
+
+
+class DedupStage():
+    """Classifies each page as a zero page, a duplicate of a cached page or a page to compress
+
+    Pages must be checked in the order they will be decoded. Only pages
+    to compress enter the cache, numbered in the order they entered, and
+    a duplicate refers to the cached page by that number.
+    """
+
+    def __init__(self, cache_pages = DEFAULT_CACHE_PAGES):
+        if cache_pages < 1:
+            raise ValueError("The dedup cache must hold at least one page")
+        self._cache_pages = cache_pages
+        self._cache = OrderedDict()
+        self._next_reference = 0
+        self.pages = 0
+        self.zero_pages = 0
+        self.duplicate_pages = 0
+        self.short_circuited_bytes = 0
+
+    def check(self, page):
+        """Return (kind, reference) for the next page, where reference is None unless kind is DUPLICATE"""
+        self.pages += 1
+        if is_zero_page(page):
+            self.zero_pages += 1
+            self.short_circuited_bytes += len(page)
+            return ZERO_PAGE, None
+
+        digest = page_digest(page)
+        reference = self._cache.get(digest)
+        if reference is not None:
+            self._cache.move_to_end(digest)
+            self.duplicate_pages += 1
+            self.short_circuited_bytes += len(page)
+            return DUPLICATE, reference
+
+        self._cache[digest] = self._next_reference
+        self._next_reference = (self._next_reference + 1) % (1 << (8 * REFERENCE_BYTES))
+        if len(self._cache) > self._cache_pages:
+            self._cache.popitem(last = False)
+        return COMPRESSED, None
+
+    def report(self):
+        """Return a printable summary of the pages short-circuited"""
+        return "\n".join(["Pages checked:\t\t\t" + str(self.pages),
+                          "Zero pages:\t\t\t" + str(self.zero_pages),
+                          "Duplicate pages:\t\t" + str(self.duplicate_pages),
+                          "Bytes short-circuited:\t\t" + str(self.short_circuited_bytes)])
+
+
+def encoded_size(kind, compressed_size = 0):
+    """Return the size of a page encoded by DedupCompressor from its kind and compressed size"""
+    if kind == ZERO_PAGE:
+        return KIND_BYTES
+    elif kind == DUPLICATE:
+        return KIND_BYTES + REFERENCE_BYTES
+    return KIND_BYTES + compressed_size
+
+
+class DedupCompressor():
+    """Puts a DedupStage in front of another compressor
+
+    compress and decompress are any pair of callables, such as the
+    methods of a WKCompressor. A compressor and the decompressor of its
+    output must each see the pages in the same order. Zero pages decode
+    to page_size bytes.
+    """
+
+    def __init__(self, compress, decompress, cache_pages = DEFAULT_CACHE_PAGES, page_size = PAGE_SIZE_BYTES):
+        self._compress = compress
+        self._decompress = decompress
+        self.stage = DedupStage(cache_pages)
+        self._cache_pages = cache_pages
+        self._page_size = page_size
+        self._decoded = OrderedDict()
+        self._next_reference = 0
+
+    def compress(self, page):
+        kind, reference = self.stage.check(page)
+        if kind == ZERO_PAGE:
+            return bytearray([ZERO_PAGE])
+        elif kind == DUPLICATE:
+            return bytearray([DUPLICATE]) + reference.to_bytes(REFERENCE_BYTES, byteorder = "big")
+        compressed_page = bytearray([COMPRESSED])
+        compressed_page += self._compress(page)
+        return compressed_page
+
+    def decompress(self, compressed_page):
+        compressed_page = memoryview(compressed_page).cast('B')
+        kind = compressed_page[0]
+        if kind == ZERO_PAGE:
+            return bytearray(self._page_size)
+        elif kind == DUPLICATE:
+            reference = int.from_bytes(compressed_page[KIND_BYTES:], byteorder = "big")
+            self._decoded.move_to_end(reference)
+            return bytearray(self._decoded[reference])
+        elif kind != COMPRESSED:
+            raise ValueError("Unknown page kind " + str(kind))
+
+        page = self._decompress(compressed_page[KIND_BYTES:])
+        self._decoded[self._next_reference] = bytes(page)
+        self._next_reference = (self._next_reference + 1) % (1 << (8 * REFERENCE_BYTES))
+        if len(self._decoded) > self._cache_pages:
+            self._decoded.popitem(last = False)
+        return page
@@ -6,23 +6,43 @@ Implementation of Huffman Coding algorithm for data compression
 @author:  Joey Lupo
 '''
 
-from heapq import heappush, heappop, heapify
-from collections import defaultdict, namedtuple
+from collections import namedtuple
 from operator import attrgetter
 import functools
+import numpy as np
 from bitarray import bitarray
 
 # A tuple containing a symbol and the length of its code in a canonical Huffman tree
 # Used in compression and decompression 
 CodeLength = namedtuple("CodeLength", 'symbol, length')
 
+# Code lengths are stored in 4 bits of the header, so no code may be longer
+MAX_CODE_LENGTH = 15
+# Shared tables are referenced by a 2 byte ID
+MAX_SHARED_TABLES = 1 << 16
+# Number of decoding tables kept, keyed by the code lengths header
+DECODE_TABLE_CACHE_SIZE = 1024
+# log2 of the number of codes between the anchors found by the decoder's Python loop
+DECODE_STRIDE_BITS = 5
+
         
-def compress(src):
-    """Public interface for returning huffman encoded source"""  
-    codebook = _create_codebook(src)
+def compress(src, histogram = None, max_length = MAX_CODE_LENGTH):
+    """Public interface for returning huffman encoded source
+    
+    A byte histogram of src the caller has already computed, such as 
+    from byte_histogram(), can be passed in to avoid counting again. No 
+    code is longer than max_length bits, which also bounds the size of 
+    the decoder's lookup tables to 2**max_length entries.
+    """  
+    if not 8 <= max_length <= MAX_CODE_LENGTH:
+        raise ValueError("Maximum code length must be between 8 and " + str(MAX_CODE_LENGTH))
+    if histogram is None:
+        histogram = byte_histogram(src)
+    codebook = _create_codebook(histogram, max_length)
     encoded_dict = _encode_dict(codebook)   
     compressed_src = bitarray()
-    compressed_src.encode(codebook, src)
+    if codebook:
+        compressed_src.encode(codebook, src)
     num_bits_encoded = len(compressed_src).to_bytes(4,byteorder = "big")
     compressed_src = compressed_src.tobytes()
     
@@ -35,59 +55,341 @@ def decompress(compressed):
     """Public interface for decoding huffman encoded source file"""   
     #unpacking the header into 3 distinct sections
     num_bits_encoded = int.from_bytes(compressed[:4], byteorder = "big")
-    code_lengths = _decode_dict(compressed[4:132])
-    coded_src = bitarray()
-    coded_src.frombytes(bytes(compressed[132:]))
-    coded_src = coded_src[:num_bits_encoded]
-    
-    codebook = _to_canonical(code_lengths)
-    uncompressed_list = coded_src.decode(codebook)
-    uncompressed = functools.reduce(lambda x,y: x+y, [b.to_bytes(1, byteorder = "big") for b in uncompressed_list])
+    return _decode(compressed[132:], num_bits_encoded, bytes(compressed[4:132]))
+
+
+def _decode(coded_src, num_bits_encoded, encoded_dict):
+    """Decode num_bits_encoded bits of coded_src with the code described by a 128 byte lengths header"""
+    if num_bits_encoded == 0:
+        return bytearray()
+    symbols = decode_symbols(coded_src, num_bits_encoded, _decode_tables(encoded_dict))
+    uncompressed = bytearray(len(symbols))
+    np.frombuffer(uncompressed, dtype = np.uint8)[:] = symbols
     return uncompressed
 
+
+def encode_symbols(src, symbols, lengths):
+    """Huffman encode a sequence of symbols with a canonical code
+    
+    The code is given by the used symbols and their code lengths, and 
+    any symbol values are allowed. Returns the number of bits encoded 
+    and the encoded bytes.
+    """
+    codebook = _to_canonical([CodeLength(symbol, length) for symbol, length in zip(symbols, lengths)])
+    encoded = bitarray()
+    encoded.encode(codebook, src)
+    return len(encoded), encoded.tobytes()
+
+
+def decode_symbols(coded_src, num_bits_encoded, tables):
+    """Decode num_bits_encoded bits of coded_src into an array of symbols using tables from lookup_tables()"""
+    table_symbols, table_lengths, max_length = tables
+    if num_bits_encoded == 0:
+        return table_symbols[:0]
+    windows = _bit_windows(coded_src, num_bits_encoded, max_length)
+    
+    # Each bit position leads to the position of the next code, found by 
+    # looking up the length of the code starting there, and decoding is 
+    # following that chain from position 0. The jump table is squared 
+    # DECODE_STRIDE_BITS times so that a short Python walk finds every 
+    # (2**DECODE_STRIDE_BITS)th code, and the codes in between are then 
+    # found for all of those anchors at once.
+    window_lengths = table_lengths[windows]
+    jump = np.minimum(np.arange(num_bits_encoded) + window_lengths, num_bits_encoded)
+    jump = np.append(jump, num_bits_encoded)
+    far_jump = jump
+    for _ in range(DECODE_STRIDE_BITS):
+        far_jump = far_jump[far_jump]
+    
+    anchors = list()
+    position = 0
+    while position < num_bits_encoded:
+        anchors.append(position)
+        next_position = far_jump[position]
+        if next_position == position:
+            raise ValueError("Huffman encoded source contains an invalid code")
+        position = next_position
+    
+    positions = np.empty((len(anchors), 1 << DECODE_STRIDE_BITS), dtype = np.int64)
+    positions[:, 0] = anchors
+    for n in range(1, 1 << DECODE_STRIDE_BITS):
+        positions[:, n] = jump[positions[:, n-1]]
+    positions = positions.reshape(-1)
+    positions = positions[positions < num_bits_encoded]
+    if not window_lengths[positions].all():
+        raise ValueError("Huffman encoded source contains an invalid code")
+    return table_symbols[windows[positions]]
+
+
+@functools.lru_cache(maxsize = DECODE_TABLE_CACHE_SIZE)
+def _decode_tables(encoded_dict):
+    """Return the lookup tables for a 128 byte code lengths header
+    
+    Tables are cached keyed by the header, so pages that share code 
+    lengths only build them once.
+    """
+    packed_lengths = np.frombuffer(encoded_dict, dtype = np.uint8)
+    lengths = np.stack((packed_lengths >> 4, packed_lengths & 0x0f), axis = 1).reshape(-1).astype(np.int64)
+    symbols = np.flatnonzero(lengths)
+    return lookup_tables(symbols.astype(np.uint8), lengths[symbols])
+
+
+def lookup_tables(symbols, lengths):
+    """Build lookup tables of the symbol and code length for every value of the next max length bits
+    
+    The code is the canonical code of the given symbols and code lengths, 
+    and the symbol table takes the dtype of symbols.
+    """
+    symbols = np.asarray(symbols)
+    lengths = np.asarray(lengths, dtype = np.int64)
+    if len(symbols) == 0:
+        raise ValueError("Huffman code contains no code lengths")
+    
+    # In canonical order (by length, then symbol) the codes are consecutive
+    # numbers, so every symbol owns the next 2**(max_length - length) 
+    # entries of a table indexed by the next max_length bits
+    order = np.lexsort((symbols, lengths))
+    symbols = symbols[order]
+    lengths = lengths[order]
+    if lengths[0] <= 0:
+        raise ValueError("Huffman code lengths must be positive")
+    max_length = int(lengths[-1])
+    spans = 1 << (max_length - lengths)
+    num_entries = int(spans.sum())
+    if num_entries > 1 << max_length:
+        raise ValueError("Huffman code lengths do not form a prefix code")
+    
+    # Entries left over by an incomplete code keep a length of 0 and are 
+    # reported as invalid codes when decoding
+    table_symbols = np.zeros(1 << max_length, dtype = symbols.dtype)
+    table_lengths = np.zeros(1 << max_length, dtype = np.int64)
+    table_symbols[:num_entries] = np.repeat(symbols, spans)
+    table_lengths[:num_entries] = np.repeat(lengths, spans)
+    return table_symbols, table_lengths, max_length
+
+
+def _bit_windows(coded_src, num_bits, width):
+    """Return the value of the width bits starting at each of the first num_bits bit positions"""
+    # Read four bytes big-endian from every byte offset, then shift out 
+    # the bits before each position. Requires width + 7 <= 32.
+    coded = np.zeros(len(coded_src) + 4, dtype = np.uint32)
+    coded[:len(coded_src)] = np.frombuffer(coded_src, dtype = np.uint8)
+    words = (coded[:-3] << 24) | (coded[1:-2] << 16) | (coded[2:-1] << 8) | coded[3:]
+    positions = np.arange(num_bits)
+    shifts = (32 - width - (positions & 7)).astype(np.uint32)
+    return (words[positions >> 3] >> shifts) & ((1 << width) - 1)
+
+    
+class SharedTables():
+    """Huffman codebooks shared by many pages and referenced by a table ID
     
-def _create_codebook(src):
-    """Return a canonical huffman encoding of the src in a dict mapping symbols to codes""" 
-    symb2freq = defaultdict(int)        
-    for byte in src:
-        symb2freq[byte] += 1
+    A page compressed by SharedTables.compress() starts with the number 
+    of bits encoded and a 2 byte table ID in place of the 128 byte code 
+    lengths header, and no codebook is built for it. Tables are either 
+    trained from a sample of pages with train(), or, when refresh_pages 
+    is set, retrained every refresh_pages pages from a running histogram 
+    of the pages compressed so far. Every byte value is given a code, so 
+    any page can be encoded with any table.
+    
+    Decoding looks a page's table up by ID, so the decoding side must 
+    hold the same tables: use the same object, or copy them over with 
+    tables() and add_table(). Once MAX_SHARED_TABLES tables have been 
+    added, each new table takes over the ID of the oldest one, so only 
+    pages compressed with the latest MAX_SHARED_TABLES tables can still 
+    be decoded. table_bytes counts the bytes of every table added, 
+    which a decoder has to be sent alongside the pages.
+    """
+    
+    def __init__(self, refresh_pages = None, max_length = MAX_CODE_LENGTH):
+        self._refresh_pages = refresh_pages
+        self._max_length = max_length
+        self._encoded_dicts = list()
+        self._codebooks = list()
+        self._histogram = np.zeros(256, dtype = np.int64)
+        self._pages_since_refresh = 0
+        self._tables_added = 0
+        self.current_id = None
+        self.table_bytes = 0
         
-    # A named tuple with a weight as the first element, a count element to break ties in 
-    # comparisons (needed as workaround for heapq.heapify), and a dictionary of symbols to codes.
-    HuffmanNode = namedtuple('HuffmanNode', 'weight, count, symbols')
-    # Create a heap out of HuffmanNodes for efficient removal of the smallest elements,
-    # i.e. a priority queue
-    heap = [HuffmanNode(symb_freq_tuple[1] , count, {symb_freq_tuple[0] : bitarray()}) 
-            for count, symb_freq_tuple in enumerate(symb2freq.items())]
-    heapify(heap)
-    
-    # As the loop iterates, the smallest two nodes are removed from the heap and 
-    # combined into a parent HuffmanNode that has their combined weight and contains a 
-    # dictionary with each of their symbols and corresponding codes. A '0' is prepended
-    # to the all the codes contained in the dictionary of the smaller of the two, while
-    # a '1' is prepended to all the codes in the dictionary of the other. The loop exits
-    # when there is only one HuffmanNode remaining with all of the symbols mapped to codes 
-    while len(heap) > 1:
-        smallest = heappop(heap)
-        next_smallest = heappop(heap)
-        for symbol, code in smallest.symbols.items():
-            smallest.symbols[symbol] = bitarray('0') + code
-        for symbol, code in next_smallest.symbols.items():
-            next_smallest.symbols[symbol] = bitarray('1') + code
-            
-        # Merge the symbols dictionaries of each child node
-        smallest.symbols.update(next_smallest.symbols)
-        parent_node = HuffmanNode(weight = smallest.weight+next_smallest.weight, count = smallest.count, symbols = smallest.symbols)
-        heappush(heap, parent_node)           
+    def tables(self):
+        """Return the 128 byte code lengths header of every table, indexed by table ID"""
+        return list(self._encoded_dicts)
+    
+    def add_table(self, encoded_dict):
+        """Add a table given by its 128 byte code lengths header, make it current and return its ID"""
+        table_id = self._tables_added % MAX_SHARED_TABLES
+        codebook = _to_canonical(_decode_dict(encoded_dict))
+        if table_id < len(self._encoded_dicts):
+            # Every ID is taken, so the oldest table is replaced
+            self._encoded_dicts[table_id] = bytes(encoded_dict)
+            self._codebooks[table_id] = codebook
+        else:
+            self._encoded_dicts.append(bytes(encoded_dict))
+            self._codebooks.append(codebook)
+        self._tables_added += 1
+        self.table_bytes += len(encoded_dict)
+        self.current_id = table_id
+        return self.current_id
+    
+    def train(self, pages):
+        """Add a table trained on a sample of pages, make it current and return its ID"""
+        histogram = np.zeros(256, dtype = np.int64)
+        for page in pages:
+            histogram += byte_histogram(page)
+        return self._add_trained_table(histogram)
+    
+    def _add_trained_table(self, histogram):
+        # Adding one to every count makes every byte value encodable
+        codebook = _create_codebook(histogram + 1, self._max_length)
+        return self.add_table(_encode_dict(codebook))
+    
+    def compress(self, src, histogram = None):
+        """Huffman encode src with the current shared table"""
+        if self._refresh_pages is not None:
+            if histogram is None:
+                histogram = byte_histogram(src)
+            self._histogram += histogram
+            self._pages_since_refresh += 1
+            if self.current_id is None or self._pages_since_refresh >= self._refresh_pages:
+                self._add_trained_table(self._histogram)
+                self._pages_since_refresh = 0
+                # Halve the running counts so that later tables follow 
+                # changes in the data rather than the whole history
+                self._histogram >>= 1
+        elif self.current_id is None:
+            raise ValueError("No shared table has been trained or added")
         
-    codebook = heap[0].symbols
-    # Create a list of tuples so that of codes and lengths so that a 
-    # canonical Huffman tree can be constructed
-    code_lengths = list()
-    for symb, code in codebook.items():
-        code_lengths.append(CodeLength(symb, len(code)))
-    codebook = _to_canonical(code_lengths)
-    return codebook
+        compressed_src = bitarray()
+        compressed_src.encode(self._codebooks[self.current_id], src)
+        compressed = bytearray()
+        compressed += (len(compressed_src).to_bytes(4, byteorder = "big") 
+                       + self.current_id.to_bytes(2, byteorder = "big") + compressed_src.tobytes())
+        return compressed
+    
+    def decompress(self, compressed):
+        """Decode a page compressed by compress() with the table it references"""
+        num_bits_encoded = int.from_bytes(compressed[:4], byteorder = "big")
+        table_id = int.from_bytes(compressed[4:6], byteorder = "big")
+        return _decode(compressed[6:], num_bits_encoded, self._encoded_dicts[table_id])
+
+
+def byte_histogram(src):
+    """Return the number of occurrences of each of the 256 byte values in src"""
+    return np.bincount(np.frombuffer(src, dtype = np.uint8), minlength = 256)
+
+
+def code_lengths(histogram, max_length = None):
+    """Return the Huffman code length of each symbol of a histogram, 0 for unused symbols
+    
+    Uses the in-place algorithm of Moffat and Katajainen on the used 
+    symbols sorted by frequency, which takes linear time after the sort 
+    and never builds the codes themselves. If max_length is given and 
+    the optimal code has a longer code, the optimal code limited to 
+    max_length is built instead.
+    """
+    histogram = np.asarray(histogram)
+    lengths = np.zeros(len(histogram), dtype = np.int64)
+    symbols = np.flatnonzero(histogram)
+    symbols = symbols[np.argsort(histogram[symbols], kind = 'stable')]
+    num_symbols = len(symbols)
+    if num_symbols <= 1:
+        # A lone symbol still needs a one bit code to be decodable
+        lengths[symbols] = 1
+        return lengths
+    
+    # Phase 1: merge the two smallest weights, taken from the sorted leaves 
+    # or the already merged internal nodes, which are created in order. 
+    # Each merged node's slot is reused to record its parent.
+    weights = histogram[symbols].tolist()
+    weights[0] += weights[1]
+    root = 0
+    leaf = 2
+    for node in range(1, num_symbols - 1):
+        if leaf >= num_symbols or weights[root] < weights[leaf]:
+            weights[node] = weights[root]
+            weights[root] = node
+            root += 1
+        else:
+            weights[node] = weights[leaf]
+            leaf += 1
+        if leaf >= num_symbols or (root < node and weights[root] < weights[leaf]):
+            weights[node] += weights[root]
+            weights[root] = node
+            root += 1
+        else:
+            weights[node] += weights[leaf]
+            leaf += 1
+    
+    # Phase 2: convert parent pointers into depths of the internal nodes
+    weights[num_symbols - 2] = 0
+    for node in range(num_symbols - 3, -1, -1):
+        weights[node] = weights[weights[node]] + 1
+    
+    # Phase 3: convert internal node depths into leaf depths
+    available = 1
+    used = 0
+    depth = 0
+    root = num_symbols - 2
+    node = num_symbols - 1
+    while available > 0:
+        while root >= 0 and weights[root] == depth:
+            used += 1
+            root -= 1
+        while available > used:
+            weights[node] = depth
+            node -= 1
+            available -= 1
+        available = 2 * used
+        depth += 1
+        used = 0
+    
+    lengths[symbols] = weights
+    if max_length is not None and weights[0] > max_length:
+        lengths[symbols] = _package_merge(histogram[symbols], max_length)
+    return lengths
+
+
+def _package_merge(weights, max_length):
+    """Return optimal code lengths no longer than max_length for weights sorted in ascending order"""
+    num_symbols = len(weights)
+    if num_symbols > 1 << max_length:
+        raise ValueError("Cannot code " + str(num_symbols) + " symbols in " + str(max_length) + " bits")
+    
+    # Build the merged list of every level from the deepest up. A level's 
+    # list is the leaves merged with the pairs (packages) of the list 
+    # below it; only whether each entry is a leaf needs to be remembered.
+    weights = np.asarray(weights, dtype = np.int64)
+    items = weights
+    is_leaf_by_level = [np.ones(num_symbols, dtype = bool)]
+    for _ in range(max_length - 1):
+        packages = items[0 : len(items) // 2 * 2 : 2] + items[1 : len(items) // 2 * 2 : 2]
+        merged = np.concatenate((weights, packages))
+        order = np.argsort(merged, kind = 'stable')
+        items = merged[order]
+        is_leaf_by_level.append(order < num_symbols)
+    
+    # The cheapest 2n - 2 entries of the top list are selected. Every 
+    # selected leaf adds one to its symbol's length, and every selected 
+    # package selects the two entries it was made from one level down. 
+    # Since lists are sorted, each level's selection is a prefix, and its 
+    # leaves are the lowest weight symbols.
+    lengths = np.zeros(num_symbols, dtype = np.int64)
+    num_selected = 2 * num_symbols - 2
+    for is_leaf in reversed(is_leaf_by_level):
+        num_leaves = int(is_leaf[:num_selected].sum())
+        lengths[:num_leaves] += 1
+        num_selected = 2 * (num_selected - num_leaves)
+    return lengths
+
+
+def _create_codebook(histogram, max_length = MAX_CODE_LENGTH):
+    """Return a canonical huffman encoding of a byte histogram in a dict mapping symbols to codes""" 
+    lengths = code_lengths(histogram, max_length)
+    symbols = np.flatnonzero(lengths)
+    if len(symbols) == 0:
+        return dict()
+    return _to_canonical([CodeLength(symbol, length) for symbol, length in 
+                          zip(symbols.tolist(), lengths[symbols].tolist())])
 
 
 def _to_canonical(code_lengths):
@@ -0,0 +1,271 @@
+'''
+Created on Oct 16, 2026
+
+Append-only store of compressed pages. The pages are written back to
+back to a data file, and a fixed-size index record is appended for each
+one to a separate index file. Page ids are positions in the index. A
+reader memory maps both files, so any page can be looked up and handed
+to its decompressor as a memoryview of the mapping, without copying it.
+This allows swap-in workloads to be replayed and the decompression
+latency of every page to be measured.
+'''
+
+import os
+import sys
+import mmap
+import time
+import argparse
+import lzma
+import bz2
+import numpy as np
+from wk import WKCompressor
+from wk_huffman import WKHuffmanCompressor
+import huffman
+import trace_reader
+
+MAGIC = b"PGSTORE1"
+# Magic followed by the word size, dict size and low bits of the WK compressor
+DATA_HEADER_BYTES = 16
+INDEX_SUFFIX = ".idx"
+
+# Algorithm ids stored in the index. wk-huffman-shared is not storable
+# since its pages cannot be decoded without the tables of earlier pages.
+ALGORITHM_IDS = {"raw" : 0, "wk" : 1, "wk-huffman" : 2, "wk-huffman-fused" : 3, "lzma" : 4, "bzip" : 5}
+ALGORITHMS = sorted(ALGORITHM_IDS, key = ALGORITHM_IDS.get)
+
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("algorithm", "u1"), ("header", "<u8")])
+
+
+def _data_header(word_size_bytes, dict_size, num_low_bits):
+    return MAGIC + b"".join(x.to_bytes(2, byteorder = "big") for x in (word_size_bytes, dict_size, num_low_bits, 0))
+
+
+def _read_data_header(header):
+    if bytes(header[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a page store")
+    fields = [int.from_bytes(header[n : n+2], byteorder = "big") for n in range(len(MAGIC), DATA_HEADER_BYTES, 2)]
+    return {"word_size_bytes" : fields[0], "dict_size" : fields[1], "num_low_bits" : fields[2]}
+
+
+class PageStoreWriter():
+    """Appends compressed pages to a page store, creating it if it does not exist
+
+    The WK parameters are fixed when the store is created; reopening an
+    existing store appends after its last page and checks that they match.
+    """
+
+    def __init__(self, path, word_size_bytes = 8, dict_size = 16, num_low_bits = 10):
+        self.wk_args = {"word_size_bytes" : word_size_bytes, "dict_size" : dict_size, "num_low_bits" : num_low_bits}
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                if _read_data_header(f.read(DATA_HEADER_BYTES)) != self.wk_args:
+                    raise ValueError("Page store " + path + " was created with different WK parameters")
+            # Drop anything past the last indexed page, such as a page
+            # whose index record was never written, and any index records
+            # of pages whose data never reached the disk. A missing index
+            # holds no pages, so the data is cut back to its header.
+            if not os.path.exists(path + INDEX_SUFFIX):
+                open(path + INDEX_SUFFIX, 'wb').close()
+            data_size = os.path.getsize(path)
+            end = DATA_HEADER_BYTES
+            with open(path + INDEX_SUFFIX, 'r+b') as f:
+                num_records = os.path.getsize(path + INDEX_SUFFIX) // INDEX_DTYPE.itemsize
+                index = np.frombuffer(f.read(num_records * INDEX_DTYPE.itemsize), dtype = INDEX_DTYPE)
+                ends = index["offset"] + index["length"]
+                num_pages = int(np.count_nonzero(ends <= data_size))
+                f.truncate(num_pages * INDEX_DTYPE.itemsize)
+                if num_pages:
+                    end = int(ends[num_pages - 1])
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+        else:
+            with open(path, 'wb') as f:
+                f.write(_data_header(word_size_bytes, dict_size, num_low_bits))
+            open(path + INDEX_SUFFIX, 'wb').close()
+            num_pages = 0
+            end = DATA_HEADER_BYTES
+
+        self._data = open(path, 'ab')
+        self._index = open(path + INDEX_SUFFIX, 'ab')
+        self._num_pages = num_pages
+        self._end = end
+        self._compressors = None
+
+    def __len__(self):
+        return self._num_pages
+
+    def append(self, compressed, algorithm, header = 0):
+        """Append a compressed page and return its page id"""
+        record = np.zeros(1, dtype = INDEX_DTYPE)
+        record[0] = (self._end, len(compressed), ALGORITHM_IDS[algorithm], header)
+        self._data.write(compressed)
+        self._index.write(record.tobytes())
+        self._end += len(compressed)
+        self._num_pages += 1
+        return self._num_pages - 1
+
+    def add(self, page, algorithm, header = 0):
+        """Compress a page with the named algorithm, append it and return its page id"""
+        return self.append(self._compress(page, algorithm), algorithm, header)
+
+    def _compress(self, page, algorithm):
+        if self._compressors is None:
+            self._compressors = {"wk" : WKCompressor(**self.wk_args),
+                                 "wk-huffman-fused" : WKHuffmanCompressor(**self.wk_args)}
+        if algorithm == "raw":
+            return bytes(page)
+        elif algorithm == "wk" or algorithm == "wk-huffman-fused":
+            return self._compressors[algorithm].compress(page)
+        elif algorithm == "wk-huffman":
+            return huffman.compress(self._compressors["wk"].compress(page))
+        elif algorithm == "lzma":
+            return lzma.compress(page)
+        elif algorithm == "bzip":
+            return bz2.compress(page)
+        raise ValueError("Algorithm must be one of " + ", ".join(ALGORITHMS))
+
+    def flush(self):
+        # Data goes first so that an index record never points past the data
+        self._data.flush()
+        self._index.flush()
+
+    def close(self):
+        self.flush()
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PageStore():
+    """Read-only random access to the pages of a page store through memory maps"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mapped = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        self.wk_args = _read_data_header(self._mapped[:DATA_HEADER_BYTES])
+        self._view = memoryview(self._mapped)
+        if os.path.getsize(path + INDEX_SUFFIX) >= INDEX_DTYPE.itemsize:
+            num_pages = os.path.getsize(path + INDEX_SUFFIX) // INDEX_DTYPE.itemsize
+            self.index = np.memmap(path + INDEX_SUFFIX, dtype = INDEX_DTYPE, mode = 'r', shape = (num_pages,))
+        else:
+            self.index = np.zeros(0, dtype = INDEX_DTYPE)
+        # Pages appended after the data file was mapped are not visible
+        ends = self.index["offset"] + self.index["length"]
+        self.index = self.index[:np.count_nonzero(ends <= len(self._mapped))]
+
+        # Contiguous copies of the columns give faster lookups than the
+        # structured records, at 13 bytes per page
+        self._offsets = np.ascontiguousarray(self.index["offset"])
+        self._lengths = np.ascontiguousarray(self.index["length"])
+        self._algorithms = np.ascontiguousarray(self.index["algorithm"])
+        wk = WKCompressor(**self.wk_args)
+        fused = WKHuffmanCompressor(**self.wk_args)
+        self._decompressors = [lambda page : page.tobytes(),
+                               wk.decompress,
+                               lambda page : wk.decompress(huffman.decompress(page)),
+                               fused.decompress,
+                               lzma.decompress,
+                               bz2.decompress]
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def get(self, page_id):
+        """Return a memoryview of the compressed page
+
+        The view points into the mapped store, so it must be released or
+        dropped before close() is called.
+        """
+        offset = int(self._offsets[page_id])
+        return self._view[offset : offset+int(self._lengths[page_id])]
+
+    def algorithm(self, page_id):
+        return ALGORITHMS[self._algorithms[page_id]]
+
+    def header(self, page_id):
+        """Return the trace header the page was stored with"""
+        return int(self.index["header"][page_id])
+
+    def decompress(self, page_id):
+        """Decompress a page straight from the mapped store"""
+        return self._decompressors[self._algorithms[page_id]](self.get(page_id))
+
+    def close(self):
+        """Unmap the store; raises BufferError while any view returned by get() is still alive"""
+        # The store's own view holds the mapping open, so it has to go first
+        self._view.release()
+        try:
+            self._mapped.close()
+        except BufferError:
+            # Leave the store usable, so that close() can be retried once the views are dropped
+            self._view = memoryview(self._mapped)
+            raise
+        self.index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build(trace, path, algorithm, wk_args = None):
+    """Compress every page of a trace into a page store and return the number of pages added"""
+    with PageStoreWriter(path, **(wk_args or {})) as writer:
+        start = len(writer)
+        for page in trace_reader.read_pages(trace):
+            writer.add(page.data, algorithm, page.header)
+        return len(writer) - start
+
+
+def replay(store, page_ids):
+    """Decompress the given pages in order and return the decompression time of each in nanoseconds"""
+    latencies = np.zeros(len(page_ids), dtype = np.int64)
+    decompress = store.decompress
+    for n, page_id in enumerate(page_ids):
+        start = time.perf_counter_ns()
+        decompress(page_id)
+        latencies[n] = time.perf_counter_ns() - start
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Build page stores from traces and replay swap-in workloads on them")
+    commands = parser.add_subparsers(dest = "command")
+    build_parser = commands.add_parser("build", help = "compress every page of a trace into a store")
+    build_parser.add_argument("trace")
+    build_parser.add_argument("store")
+    build_parser.add_argument("algorithm", choices = ALGORITHMS)
+    build_parser.add_argument("word_size_bytes", type = int, nargs = "?", default = 8)
+    build_parser.add_argument("dict_size", type = int, nargs = "?", default = 16)
+    build_parser.add_argument("num_low_bits", type = int, nargs = "?", default = 10)
+    replay_parser = commands.add_parser("replay", help = "decompress pages of a store and report their latency")
+    replay_parser.add_argument("store")
+    replay_parser.add_argument("--order", choices = ["sequential", "random"], default = "sequential")
+    replay_parser.add_argument("--count", type = int, default = None, help = "number of swap-ins to replay")
+    replay_parser.add_argument("--seed", type = int, default = 7)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        wk_args = {"word_size_bytes" : args.word_size_bytes, "dict_size" : args.dict_size,
+                   "num_low_bits" : args.num_low_bits}
+        print("Stored", build(args.trace, args.store, args.algorithm, wk_args), "pages")
+    elif args.command == "replay":
+        with PageStore(args.store) as store:
+            count = len(store) if args.count is None else args.count
+            if args.order == "sequential":
+                page_ids = [n % len(store) for n in range(count)]
+            else:
+                page_ids = np.random.RandomState(args.seed).randint(len(store), size = count).tolist()
+            latencies = replay(store, page_ids)
+            print("swap-ins\tp50 us\tp99 us\tmax us\tmean us")
+            print(count, *("{0:.1f}".format(x / 1e3) for x in (np.percentile(latencies, 50),
+                  np.percentile(latencies, 99), latencies.max(), latencies.mean())), sep = "\t")
+    else:
+        parser.print_help()
+        sys.exit(1)
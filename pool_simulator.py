@@ -0,0 +1,371 @@
+'''
+Created on Oct 16, 2026
+
+Simulates a zswap-style compressed RAM pool driven by a trace. Every
+record of the trace is an access to the page named by its 8 byte
+header, with the record's contents as the page's current data. Pages
+live in a resident set of uncompressed pages kept in LRU order. A page
+evicted from it is really compressed into a bounded pool, unless it
+does not compress well enough. A later access to a pooled page is a
+fault that the pool services by really decompressing the page. An
+access to a page that is in neither place is a fault that has to go to
+the backing swap device. When the pool is full, a pluggable eviction
+policy picks entries to write back to swap.
+
+The pool's memory is accounted by a model of the kernel allocator
+storing the variable-sized compressed pages, so the fragmentation they
+cause counts against the pool's capacity.
+'''
+
+import time
+import random
+import argparse
+from collections import OrderedDict
+import numpy as np
+from wk import WKCompressor, PAGE_SIZE_BYTES
+from wk_huffman import WKHuffmanCompressor
+from adaptive import AdaptiveCompressor
+import trace_reader
+import huffman
+
+CODECS = ["wk", "wk-huffman", "wk-huffman-fused", "adaptive"]
+DEFAULT_POOL_BYTES = 64 * 2**20
+DEFAULT_RESIDENT_PAGES = 1024
+# zswap rejects pages that compress to more than this fraction of a page
+DEFAULT_MAX_COMPRESSED_FRACTION = 0.9
+LATENCY_PERCENTILES = [50, 99]
+
+
+def make_codec(name, wk_args = None):
+    """Return the (compress, decompress) functions of a named codec"""
+    wk_args = wk_args or {}
+    if name == "wk":
+        wk = WKCompressor(**wk_args)
+        return wk.compress, wk.decompress
+    elif name == "wk-huffman":
+        wk = WKCompressor(**wk_args)
+        return (lambda page : huffman.compress(wk.compress(page)),
+                lambda compressed : wk.decompress(huffman.decompress(compressed)))
+    elif name == "wk-huffman-fused":
+        wk_huffman = WKHuffmanCompressor(**wk_args)
+        return wk_huffman.compress, wk_huffman.decompress
+    elif name == "adaptive":
+        adaptive = AdaptiveCompressor(**wk_args)
+        return adaptive.compress, adaptive.decompress
+    raise ValueError("Codec must be one of " + ", ".join(CODECS))
+
+
+class SizeClassAllocator():
+    """Models zsmalloc: objects are rounded up to a size class and packed densely within their class"""
+
+    def __init__(self, class_bytes = 16):
+        self._class_bytes = class_bytes
+        self._class_counts = dict()
+        self._sizes = dict()
+        self._next_handle = 0
+
+    def alloc(self, size):
+        """Store an object of size bytes and return its handle"""
+        size_class = -(-size // self._class_bytes) * self._class_bytes
+        self._class_counts[size_class] = self._class_counts.get(size_class, 0) + 1
+        handle = self._next_handle
+        self._next_handle += 1
+        self._sizes[handle] = size_class
+        return handle
+
+    def free(self, handle):
+        self._class_counts[self._sizes.pop(handle)] -= 1
+
+    @property
+    def pool_bytes(self):
+        """Bytes of memory held, in whole pages per size class"""
+        return sum(-(-count * size_class // PAGE_SIZE_BYTES) * PAGE_SIZE_BYTES
+                   for size_class, count in self._class_counts.items())
+
+
+class ZbudAllocator():
+    """Models zbud: every pool page holds at most two objects, allocated in 64 byte chunks"""
+
+    CHUNK_BYTES = 64
+    # The first chunk of every page holds its header
+    NUM_CHUNKS = PAGE_SIZE_BYTES // CHUNK_BYTES - 1
+
+    def __init__(self):
+        # Pages holding a single object, by the number of chunks they have free
+        self._unbuddied = [set() for _ in range(self.NUM_CHUNKS + 1)]
+        self._pages = dict()
+        self._next_page = 0
+        self._objects = dict()
+        self._next_handle = 0
+
+    def alloc(self, size):
+        """Store an object of size bytes and return its handle"""
+        chunks = -(-size // self.CHUNK_BYTES)
+        if chunks > self.NUM_CHUNKS:
+            raise ValueError("Object of " + str(size) + " bytes does not fit in a zbud page")
+        page = None
+        for free_chunks in range(chunks, self.NUM_CHUNKS + 1):
+            if self._unbuddied[free_chunks]:
+                page = self._unbuddied[free_chunks].pop()
+                break
+        if page is None:
+            page = self._next_page
+            self._next_page += 1
+            self._pages[page] = list()
+        self._pages[page].append(chunks)
+        if len(self._pages[page]) == 1 and self.NUM_CHUNKS - chunks > 0:
+            self._unbuddied[self.NUM_CHUNKS - chunks].add(page)
+        handle = self._next_handle
+        self._next_handle += 1
+        self._objects[handle] = (page, chunks)
+        return handle
+
+    def free(self, handle):
+        page, chunks = self._objects.pop(handle)
+        objects = self._pages[page]
+        if len(objects) == 1:
+            self._unbuddied[self.NUM_CHUNKS - chunks].discard(page)
+            del self._pages[page]
+            return
+        objects.remove(chunks)
+        self._unbuddied[self.NUM_CHUNKS - objects[0]].add(page)
+
+    @property
+    def pool_bytes(self):
+        """Bytes of memory held, one page per zbud page"""
+        return len(self._pages) * PAGE_SIZE_BYTES
+
+
+ALLOCATORS = {"zsmalloc" : SizeClassAllocator, "zbud" : ZbudAllocator}
+
+
+class LRUPolicy():
+    """Evicts the entry stored longest ago, as zswap does; entries leave the pool when loaded, so this is also LRU"""
+
+    def __init__(self):
+        self._order = OrderedDict()
+
+    def insert(self, page_id, size):
+        self._order[page_id] = size
+
+    def remove(self, page_id):
+        del self._order[page_id]
+
+    def victim(self):
+        return next(iter(self._order))
+
+
+class LargestFirstPolicy():
+    """Evicts the entry taking the most space, which frees the pool with the fewest writebacks"""
+
+    def __init__(self):
+        self._sizes = dict()
+        self._by_size = [OrderedDict() for _ in range(PAGE_SIZE_BYTES + 1)]
+        self._largest = 0
+
+    def insert(self, page_id, size):
+        size = min(size, PAGE_SIZE_BYTES)
+        self._sizes[page_id] = size
+        self._by_size[size][page_id] = None
+        self._largest = max(self._largest, size)
+
+    def remove(self, page_id):
+        del self._by_size[self._sizes.pop(page_id)][page_id]
+
+    def victim(self):
+        while not self._by_size[self._largest]:
+            self._largest -= 1
+        return next(iter(self._by_size[self._largest]))
+
+
+class RandomPolicy():
+    """Evicts an entry chosen at random"""
+
+    def __init__(self, seed = None):
+        self._random = random.Random(seed)
+        self._ids = list()
+        self._positions = dict()
+
+    def insert(self, page_id, size):
+        self._positions[page_id] = len(self._ids)
+        self._ids.append(page_id)
+
+    def remove(self, page_id):
+        position = self._positions.pop(page_id)
+        last = self._ids.pop()
+        if position < len(self._ids):
+            self._ids[position] = last
+            self._positions[last] = position
+
+    def victim(self):
+        return self._random.choice(self._ids)
+
+
+POLICIES = {"lru" : LRUPolicy, "largest" : LargestFirstPolicy, "random" : RandomPolicy}
+
+
+class CompressedPool():
+    """A pool of compressed pages bounded to capacity_bytes of allocator memory"""
+
+    def __init__(self, capacity_bytes, compress, decompress, allocator, policy,
+                 max_compressed_fraction = DEFAULT_MAX_COMPRESSED_FRACTION):
+        self.capacity_bytes = capacity_bytes
+        self._compress = compress
+        self._decompress = decompress
+        self._allocator = allocator
+        self._policy = policy
+        self._max_compressed_bytes = int(max_compressed_fraction * PAGE_SIZE_BYTES)
+        # page id -> (compressed page, allocator handle)
+        self._entries = dict()
+        self.compressed_bytes = 0
+        self.stores = 0
+        self.rejects = 0
+        self.writebacks = 0
+        self.load_seconds = list()
+
+    def __contains__(self, page_id):
+        return page_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def pool_bytes(self):
+        return self._allocator.pool_bytes
+
+    def store(self, page_id, page):
+        """Compress a page into the pool, writing entries back to swap to make room, and return False if rejected"""
+        if page_id in self._entries:
+            self._remove(page_id)
+        compressed = self._compress(page)
+        if len(compressed) > self._max_compressed_bytes:
+            self.rejects += 1
+            return False
+        self._entries[page_id] = (compressed, self._allocator.alloc(len(compressed)))
+        self._policy.insert(page_id, len(compressed))
+        self.compressed_bytes += len(compressed)
+        self.stores += 1
+        while self.pool_bytes > self.capacity_bytes and self._entries:
+            self._remove(self._policy.victim())
+            self.writebacks += 1
+        return page_id in self._entries
+
+    def load(self, page_id):
+        """Decompress a page out of the pool, removing it, and return its contents"""
+        compressed, _ = self._entries[page_id]
+        start = time.perf_counter()
+        page = self._decompress(compressed)
+        self.load_seconds.append(time.perf_counter() - start)
+        if len(page) != PAGE_SIZE_BYTES:
+            raise ValueError("Page " + str(page_id) + " decompressed to " + str(len(page)) + " bytes")
+        self._remove(page_id)
+        return page
+
+    def _remove(self, page_id):
+        compressed, handle = self._entries.pop(page_id)
+        self._allocator.free(handle)
+        self._policy.remove(page_id)
+        self.compressed_bytes -= len(compressed)
+
+
+class Simulator():
+    """Replays page accesses against a resident set of resident_pages pages backed by a CompressedPool"""
+
+    def __init__(self, pool, resident_pages = DEFAULT_RESIDENT_PAGES):
+        self.pool = pool
+        self._resident_pages = resident_pages
+        self._resident = OrderedDict()
+        self.accesses = 0
+        self.resident_hits = 0
+        self.pool_hits = 0
+        self.misses = 0
+        # Sums over accesses, for the averages over the run
+        self._pooled_pages_sum = 0
+        self._pool_bytes_sum = 0
+        self._compressed_bytes_sum = 0
+
+    def access(self, page_id, page):
+        """Access a page whose current contents are page"""
+        self.accesses += 1
+        if page_id in self._resident:
+            self.resident_hits += 1
+            self._resident.move_to_end(page_id)
+        elif page_id in self.pool:
+            self.pool_hits += 1
+            self.pool.load(page_id)
+        else:
+            self.misses += 1
+        self._resident[page_id] = page
+        while len(self._resident) > self._resident_pages:
+            evicted_id, evicted = self._resident.popitem(last = False)
+            self.pool.store(evicted_id, evicted)
+        self._pooled_pages_sum += len(self.pool)
+        self._pool_bytes_sum += self.pool.pool_bytes
+        self._compressed_bytes_sum += self.pool.compressed_bytes
+
+    def report(self):
+        """Return a dict of the hit rate, capacity, fragmentation and fault latency of the run"""
+        faults = self.pool_hits + self.misses
+        latencies = np.array(self.pool.load_seconds) * 1e6
+        report = {"accesses" : self.accesses,
+                  "resident_hits" : self.resident_hits,
+                  "pool_hits" : self.pool_hits,
+                  "misses" : self.misses,
+                  "pool_hit_rate" : self.pool_hits / faults if faults else None,
+                  "stores" : self.pool.stores,
+                  "rejects" : self.pool.rejects,
+                  "writebacks" : self.pool.writebacks,
+                  # Uncompressed bytes held per byte of pool memory
+                  "effective_capacity" : self._pooled_pages_sum * PAGE_SIZE_BYTES / self._pool_bytes_sum
+                                         if self._pool_bytes_sum else None,
+                  # Fraction of pool memory not holding compressed data
+                  "fragmentation" : 1 - self._compressed_bytes_sum / self._pool_bytes_sum
+                                    if self._pool_bytes_sum else None,
+                  "mean_fault_us" : float(latencies.mean()) if len(latencies) else None}
+        for q in LATENCY_PERCENTILES:
+            report["p" + str(q) + "_fault_us"] = float(np.percentile(latencies, q)) if len(latencies) else None
+        return report
+
+
+def simulate(trace, codec = "wk", wk_args = None, pool_bytes = DEFAULT_POOL_BYTES,
+             resident_pages = DEFAULT_RESIDENT_PAGES, policy = "lru", allocator = "zsmalloc",
+             max_compressed_fraction = DEFAULT_MAX_COMPRESSED_FRACTION, max_pages = None, seed = None):
+    """Replay the pages of a trace through a simulated compressed pool and return the Simulator"""
+    compress, decompress = make_codec(codec, wk_args)
+    policy = RandomPolicy(seed) if policy == "random" else POLICIES[policy]()
+    pool = CompressedPool(pool_bytes, compress, decompress, ALLOCATORS[allocator](), policy, max_compressed_fraction)
+    simulator = Simulator(pool, resident_pages)
+    for page in trace_reader.read_pages(trace):
+        if max_pages is not None and page.index >= max_pages:
+            break
+        simulator.access(page.header, bytes(page.data))
+    return simulator
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Simulate a compressed RAM pool fed by the pages of a trace")
+    parser.add_argument("trace")
+    parser.add_argument("codec", choices = CODECS)
+    parser.add_argument("word_size_bytes", type = int, nargs = "?", default = 8)
+    parser.add_argument("dict_size", type = int, nargs = "?", default = 16)
+    parser.add_argument("num_low_bits", type = int, nargs = "?", default = 10)
+    parser.add_argument("--pool-bytes", type = int, default = DEFAULT_POOL_BYTES,
+                        help = "memory the compressed pool may use")
+    parser.add_argument("--resident-pages", type = int, default = DEFAULT_RESIDENT_PAGES,
+                        help = "number of uncompressed pages kept resident")
+    parser.add_argument("--policy", choices = sorted(POLICIES), default = "lru",
+                        help = "which pool entry to write back when the pool is full")
+    parser.add_argument("--allocator", choices = sorted(ALLOCATORS), default = "zsmalloc")
+    parser.add_argument("--max-compressed-fraction", type = float, default = DEFAULT_MAX_COMPRESSED_FRACTION,
+                        help = "reject pages that compress to more than this fraction of a page")
+    parser.add_argument("--max-pages", type = int, default = None)
+    parser.add_argument("--seed", type = int, default = None, help = "seed of the random policy")
+    args = parser.parse_args()
+
+    wk_args = {'word_size_bytes': args.word_size_bytes, 'dict_size': args.dict_size,
+               'num_low_bits': args.num_low_bits}
+    simulator = simulate(args.trace, args.codec, wk_args, args.pool_bytes, args.resident_pages, args.policy,
+                         args.allocator, args.max_compressed_fraction, args.max_pages, args.seed)
+    for name, value in simulator.report().items():
+        print(name, "-" if value is None else "{0:.4f}".format(value) if isinstance(value, float) else value,
+              sep = "\t")
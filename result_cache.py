@@ -0,0 +1,185 @@
+'''
+Created on Oct 16, 2026
+
+Persistent cache of finished runs, so that a sweep never recomputes a
+(trace, configuration) pair it has already done. Entries are results
+files in the format of results.py, addressed by a hash of the trace's
+content, the run configuration and the source of the code that computes
+the sizes. An identical trace at another path, or last week's run of a
+configuration, is therefore found again, while any change to a
+compressor invalidates its old entries.
+
+Writers never lock: an entry is written to a uniquely named temporary
+file and renamed into place, so concurrent writers of the same entry
+leave one complete copy and readers never see a partial one. Reading an
+entry touches it, and the least recently used entries are evicted
+whenever the cache grows beyond its size bound.
+'''
+
+import os
+import sys
+import json
+import uuid
+import hashlib
+import argparse
+import numpy as np
+import results
+
+DEFAULT_MAX_BYTES = 10 * 2**30
+ENTRIES_DIR = "entries"
+TRACES_DIR = "traces"
+ENTRY_SUFFIX = ".bin"
+HASH_CHUNK_BYTES = 2**20
+# Modules whose source determines the sizes a run records
+CODE_FILES = ["wk.py", "wk_huffman.py", "huffman.py", "bitpack.py", "adaptive.py", "trace_reader.py",
+              "cluster_tester.py", "results.py"]
+
+
+def _hash_file(path):
+    digest = hashlib.blake2b(digest_size = 20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda : f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_version():
+    """Return a hash of the source of the modules that compute a run's sizes"""
+    digest = hashlib.blake2b(digest_size = 20)
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_FILES:
+        digest.update(name.encode())
+        with open(os.path.join(base_dir, name), 'rb') as f:
+            # Line endings depend on the checkout, not on the code
+            digest.update(f.read().replace(b"\r\n", b"\n"))
+    return digest.hexdigest()
+
+
+def _write_atomically(path, data):
+    temp_path = path + "." + uuid.uuid4().hex + ".tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class ResultCache():
+    """A size-bounded, content-addressed cache of finished runs in the directory root"""
+
+    def __init__(self, root, max_bytes = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._code_version = code_version()
+        os.makedirs(os.path.join(root, ENTRIES_DIR), exist_ok = True)
+        os.makedirs(os.path.join(root, TRACES_DIR), exist_ok = True)
+
+    def trace_hash(self, trace):
+        """Return the content hash of a trace
+
+        Hashing a large trace takes a while, so the hash is remembered in
+        the cache together with the trace's size and modification time
+        and only recomputed when either changes.
+        """
+        path = os.path.abspath(trace)
+        info = os.stat(path)
+        memo_path = os.path.join(self.root, TRACES_DIR, hashlib.blake2b(path.encode(), digest_size = 20).hexdigest())
+        try:
+            with open(memo_path) as f:
+                memo = json.load(f)
+            if memo["size"] == info.st_size and memo["mtime_ns"] == info.st_mtime_ns:
+                return memo["hash"]
+        except (OSError, ValueError, KeyError):
+            pass
+        trace_hash = _hash_file(path)
+        memo = {"path" : path, "size" : info.st_size, "mtime_ns" : info.st_mtime_ns, "hash" : trace_hash}
+        _write_atomically(memo_path, json.dumps(memo).encode())
+        return trace_hash
+
+    def key(self, trace_hash, config):
+        """Return the key of the run of config over the trace with content hash trace_hash"""
+        encoded = json.dumps({"trace" : trace_hash, "config" : config, "code" : self._code_version},
+                             sort_keys = True).encode()
+        return hashlib.blake2b(encoded, digest_size = 20).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.root, ENTRIES_DIR, key[:2], key + ENTRY_SUFFIX)
+
+    def __contains__(self, key):
+        return os.path.exists(self._entry_path(key))
+
+    def get(self, key):
+        """Return the sizes and trace headers of a cached run as a results record array, or None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                _, offset = results.read_preamble(f)
+                f.seek(offset)
+                records = np.frombuffer(f.read(), dtype = results.RESULT_DTYPE)
+            os.utime(path)
+        except FileNotFoundError:
+            # Never written, or evicted by another process
+            return None
+        return records
+
+    def put(self, key, results_path):
+        """Add the results file of a finished run, then evict entries if the cache is over its bound"""
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        with open(results_path, 'rb') as f:
+            _write_atomically(path, f.read())
+        self.evict()
+
+    def entries(self):
+        """Return (last use, size, path) of every entry, least recently used first"""
+        entries = list()
+        for directory, _, files in os.walk(os.path.join(self.root, ENTRIES_DIR)):
+            for name in files:
+                if not name.endswith(ENTRY_SUFFIX):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    info = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((info.st_mtime_ns, info.st_size, path))
+        return sorted(entries)
+
+    def evict(self, max_bytes = None):
+        """Remove the least recently used entries until the cache holds at most max_bytes, and return how many"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                # Another writer evicted it first
+                pass
+            total -= size
+        return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Show the size of a result cache and evict entries beyond a bound")
+    parser.add_argument("cache_dir")
+    parser.add_argument("--max-bytes", type = int, default = None,
+                        help = "evict least recently used entries until the cache holds at most MAX_BYTES")
+    args = parser.parse_args()
+
+    if not os.path.isdir(os.path.join(args.cache_dir, ENTRIES_DIR)):
+        sys.exit("No result cache in " + args.cache_dir)
+    cache = ResultCache(args.cache_dir)
+    if args.max_bytes is not None:
+        print("evicted\t" + str(cache.evict(args.max_bytes)))
+    entries = cache.entries()
+    print("entries\t" + str(len(entries)))
+    print("bytes\t" + str(sum(size for _, size, _ in entries)))
@@ -0,0 +1,64 @@
+'''
+Created on Oct 16, 2026
+
+Compact binary format for the per-page results of a run. A results file
+starts with a preamble holding the run configuration as JSON, followed
+by one fixed-size record per page: the compressed size as a uint16 and
+the page's trace header as a uint64, both little-endian. The records
+can be memory mapped as a NumPy structured array, so a run of millions
+of pages loads instantly and is aggregated with vectorized operations.
+'''
+
+import json
+import numpy as np
+
+MAGIC = b"CTLRES01"
+RESULT_DTYPE = np.dtype([("size", "<u2"), ("header", "<u8")])
+MAX_SIZE = np.iinfo(np.uint16).max
+# Records start on a multiple of this many bytes
+PREAMBLE_ALIGNMENT = 8
+
+
+def preamble(config):
+    """Return the preamble of a results file for a run configuration"""
+    encoded = json.dumps(config, sort_keys = True).encode()
+    encoded += b" " * (-(len(MAGIC) + 4 + len(encoded)) % PREAMBLE_ALIGNMENT)
+    return MAGIC + len(encoded).to_bytes(4, byteorder = "little") + encoded
+
+
+def read_preamble(f):
+    """Return (config, size of the preamble) read from the start of an open results file"""
+    f.seek(0)
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a results file")
+    length = int.from_bytes(f.read(4), byteorder = "little")
+    return json.loads(f.read(length).decode()), len(MAGIC) + 4 + length
+
+
+def to_records(sizes, headers):
+    """Return the records for pages with the given compressed sizes and trace headers"""
+    sizes = np.asarray(sizes, dtype = np.int64)
+    if len(sizes) and sizes.max() > MAX_SIZE:
+        raise ValueError("Compressed size " + str(sizes.max()) + " does not fit in a results record")
+    records = np.zeros(len(sizes), dtype = RESULT_DTYPE)
+    records["size"] = sizes
+    records["header"] = headers
+    return records
+
+
+def write_results(path, config, sizes, headers):
+    """Write a complete results file in one go"""
+    with open(path, 'wb') as f:
+        f.write(preamble(config))
+        f.write(to_records(sizes, headers).tobytes())
+
+
+def open_results(path):
+    """Return (config, memory mapped records) of a results file"""
+    with open(path, 'rb') as f:
+        config, offset = read_preamble(f)
+        f.seek(0, 2)
+        num_records = (f.tell() - offset) // RESULT_DTYPE.itemsize
+    if num_records == 0:
+        return config, np.zeros(0, dtype = RESULT_DTYPE)
+    return config, np.memmap(path, dtype = RESULT_DTYPE, mode = 'r', offset = offset, shape = (num_records,))
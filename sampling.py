@@ -0,0 +1,93 @@
+'''
+Created on Oct 16, 2026
+
+Samples pages from across a whole trace for quick estimates of a
+compression ratio. When the number of records is known, the trace is
+split into equal strata and one page drawn at random from each. Raw and
+block-indexed xz traces are read only where the sampled pages are. For
+other traces and pipes, a reservoir sample is drawn in one pass. Either
+way the pages are handed out in random order, so any prefix of the
+sample is itself a random sample. An estimate can therefore be refined
+round by round until its confidence interval is narrow enough.
+'''
+
+import math
+import statistics
+import numpy as np
+import trace_reader
+
+DEFAULT_CONFIDENCE = 0.95
+
+
+def stratified_indices(num_records, num_samples, rng):
+    """Return one record number drawn at random from each of num_samples equal strata of a trace"""
+    num_samples = min(num_samples, num_records)
+    bounds = np.linspace(0, num_records, num_samples + 1).astype(np.int64)
+    return rng.integers(bounds[:-1], bounds[1:])
+
+
+def reservoir(pages, num_samples, rng):
+    """Return a uniform random sample of (index, header, bytes) of up to num_samples pages from a stream"""
+    sample = list()
+    for seen, page in enumerate(pages):
+        if seen < num_samples:
+            sample.append((page.index, page.header, bytes(page.data)))
+        else:
+            slot = rng.integers(seen + 1)
+            if slot < num_samples:
+                sample[slot] = (page.index, page.header, bytes(page.data))
+    return sample
+
+
+class PageSample():
+    """A random sample of up to max_pages pages of a trace, read as they are asked for where the trace allows"""
+
+    def __init__(self, trace, max_pages, seed = None):
+        self.trace = trace
+        rng = np.random.default_rng(seed)
+        self.num_records = trace_reader.num_records(trace)
+        self._pages = None
+        if self.num_records is None:
+            self._order = None
+            self._pages = reservoir(trace_reader.read_pages(trace), max_pages, rng)
+        else:
+            self._order = rng.permutation(stratified_indices(self.num_records, max_pages, rng))
+            if not trace_reader.seekable(trace):
+                # Decode the trace once rather than once per round
+                read = {page.index : (page.index, page.header, bytes(page.data))
+                        for page in trace_reader.read_records(trace, self._order.tolist())}
+                self._pages = [read[index] for index in self._order.tolist() if index in read]
+        if self._order is None:
+            rng.shuffle(self._pages)
+
+    def __len__(self):
+        return len(self._pages) if self._pages is not None else len(self._order)
+
+    def pages(self, start, stop):
+        """Return the page bytes of samples start to stop"""
+        if self._pages is not None:
+            return [data for _, _, data in self._pages[start:stop]]
+        wanted = self._order[start:stop].tolist()
+        read = {page.index : bytes(page.data) for page in trace_reader.read_records(self.trace, wanted)}
+        return [read[index] for index in wanted]
+
+
+def confidence_interval(values, confidence = DEFAULT_CONFIDENCE, population = None):
+    """Return (mean, half width of the confidence interval) of the mean of a sample
+
+    The interval is the normal approximation, with the finite population
+    correction if the size of the population is known. Stratified samples
+    vary less than simple random ones, so for them it is conservative.
+    """
+    values = np.asarray(values, dtype = np.float64)
+    n = len(values)
+    if n == 0:
+        return None, math.inf
+    mean = float(values.mean())
+    if n < 2:
+        return mean, math.inf
+    standard_error = float(values.std(ddof = 1)) / math.sqrt(n)
+    if population is not None and population > 1:
+        standard_error *= math.sqrt(max(population - n, 0) / (population - 1))
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    return mean, z * standard_error
@@ -1,6 +1,125 @@
 '''
 Created on Mar 5, 2017
 
+Aggregates the results files written by cluster_tester.py --checkpoint.
+Every run is memory mapped and summarized with vectorized NumPy
+operations, so a results tree with millions of pages per run loads in
+seconds. Runs can also be compared page by page against a baseline run
+over the same trace.
+
 @author: Joey Lupo
 '''
 
+import os
+import sys
+import csv
+import argparse
+import numpy as np
+import results
+
+RESULTS_FILE_NAME = "results.bin"
+PERCENTILES = [50, 90, 99]
+SUMMARY_FIELDS = ["algorithm", "word_size_bits", "dict_size", "num_low_bits", "pages", "ratio", "mean_size"] \
+    + ["p" + str(q) for q in PERCENTILES] + ["incompressible"]
+
+
+def find_runs(results_dir):
+    """Return the paths of every results file under a directory"""
+    paths = list()
+    for directory, _, files in os.walk(results_dir):
+        if RESULTS_FILE_NAME in files:
+            paths.append(os.path.join(directory, RESULTS_FILE_NAME))
+    return sorted(paths)
+
+
+def load_runs(paths):
+    """Return a list of (config, records) for the results files"""
+    return [results.open_results(path) for path in paths]
+
+
+def run_key(config):
+    """Return (algorithm, word_size_bits, dict_size, num_low_bits) naming a run's configuration"""
+    if "word_size_bytes" not in config:
+        return (config["algorithm"], None, None, None)
+    return (config["algorithm"], 8 * config["word_size_bytes"], config["dict_size"], config["num_low_bits"])
+
+
+def summarize(config, records):
+    """Return a summary row of a run's compression ratio and distribution of page sizes"""
+    sizes = records["size"]
+    page_size = config.get("page_size_bytes", 4096)
+    row = dict(zip(SUMMARY_FIELDS, run_key(config)))
+    row["pages"] = len(sizes)
+    if len(sizes) == 0:
+        return row
+    # Sum in int64 since the total of millions of uint16 sizes overflows
+    total = int(sizes.sum(dtype = np.int64))
+    row["ratio"] = total / (len(sizes) * page_size)
+    row["mean_size"] = total / len(sizes)
+    for q, value in zip(PERCENTILES, np.percentile(sizes, PERCENTILES)):
+        row["p" + str(q)] = float(value)
+    row["incompressible"] = float(np.count_nonzero(sizes >= page_size) / len(sizes))
+    return row
+
+
+def compare(runs, baseline_key):
+    """Compare every run with the baseline run and return (key, ratio to baseline, fraction of pages smaller)
+
+    Page by page comparisons need both runs to cover the same pages, so
+    the fraction of smaller pages is None for runs of a different length.
+    Fields of baseline_key that are None match any value.
+    """
+    baselines = [records for config, records in runs
+                 if all(field is None or field == value for field, value in zip(baseline_key, run_key(config)))]
+    if not baselines:
+        raise ValueError("No run has the baseline configuration " + str(baseline_key))
+    baseline_sizes = baselines[0]["size"]
+    baseline_total = int(baseline_sizes.sum(dtype = np.int64))
+
+    rows = list()
+    for config, records in runs:
+        sizes = records["size"]
+        relative = int(sizes.sum(dtype = np.int64)) / baseline_total if baseline_total else None
+        smaller = None
+        if len(sizes) == len(baseline_sizes) and len(sizes):
+            smaller = float(np.count_nonzero(sizes < baseline_sizes) / len(sizes))
+        rows.append((run_key(config), relative, smaller))
+    return rows
+
+
+def _format(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return "{0:.4f}".format(value)
+    return str(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Summarize and compare the results files of a results tree")
+    parser.add_argument("results_dir", nargs = "?", default = "results")
+    parser.add_argument("--baseline", nargs = "+", default = None, metavar = "CONFIG",
+                        help = "baseline run as ALGORITHM [WORD_SIZE_BITS DICT_SIZE NUM_LOW_BITS]")
+    parser.add_argument("--csv", default = None, help = "also write the summary to a CSV file")
+    args = parser.parse_args()
+
+    runs = load_runs(find_runs(args.results_dir))
+    if not runs:
+        sys.exit("No " + RESULTS_FILE_NAME + " files under " + args.results_dir)
+    rows = sorted((summarize(config, records) for config, records in runs), key = lambda row : row.get("ratio", 1))
+
+    print("\t".join(SUMMARY_FIELDS))
+    for row in rows:
+        print("\t".join(_format(row.get(field)) for field in SUMMARY_FIELDS))
+    if args.csv is not None:
+        with open(args.csv, 'w', newline = '') as f:
+            writer = csv.DictWriter(f, fieldnames = SUMMARY_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    if args.baseline is not None:
+        baseline_key = tuple([args.baseline[0]] + [int(x) for x in args.baseline[1:]] + [None] * (4 - len(args.baseline)))
+        print()
+        print("configuration\tratio to baseline\tpages smaller")
+        for key, relative, smaller in compare(runs, baseline_key):
+            print(" ".join(str(x) for x in key if x is not None), _format(relative), _format(smaller), sep = "\t")
@@ -0,0 +1,276 @@
+'''
+Created on Oct 16, 2026
+
+Evaluates a whole grid of compressor configurations against a trace in a
+single pass. The trace is decompressed once into a temporary file that
+every worker process memory maps, so the pages are shared through the
+page cache instead of being decoded again for every configuration.
+In sampling mode only a random sample of pages from across the trace is
+evaluated. The sample grows until the confidence interval of every
+configuration's ratio is narrow enough.
+'''
+
+import os
+import sys
+import csv
+import lzma
+import bz2
+import argparse
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from wk import WKCompressor
+from trace_reader import RECORD_HEADER_BYTES, RECORD_SIZE_BYTES
+import trace_reader
+import huffman
+import sampling
+
+# The default grid matches the jobs generated by compress_all.py
+WORD_SIZES_BITS = [32, 64]
+DICT_SIZES = [2**n for n in range(1, 11)]
+LOW_BITS = list(range(4, 17))
+WK_ALGORITHMS = ["wk", "wk-huffman"]
+OTHER_ALGORITHMS = ["lzma", "bzip"]
+RESULT_FIELDS = ["algorithm", "word_size_bits", "dict_size", "num_low_bits", "associativity",
+                 "pages", "uncompressed_bytes", "compressed_bytes", "ratio"]
+SAMPLE_FIELDS = RESULT_FIELDS + ["ratio_low", "ratio_high", "trace_pages"]
+# Pages evaluated in the first round of sampling mode; every later round doubles the sample
+FIRST_ROUND_PAGES = 256
+
+# Per-process state set up by _init_worker
+_records = None
+_configs = None
+_compressors = None
+
+
+def make_grid(word_sizes_bits = WORD_SIZES_BITS, dict_sizes = DICT_SIZES, low_bits = LOW_BITS,
+              algorithms = WK_ALGORITHMS + OTHER_ALGORITHMS):
+    """Return the list of (algorithm, word_size_bytes, dict_size, num_low_bits) configurations"""
+    configs = list()
+    for word_size_bits, dict_size, num_low_bits, algorithm in itertools.product(word_sizes_bits, dict_sizes,
+                                                                                low_bits, algorithms):
+        if algorithm in WK_ALGORITHMS:
+            configs.append((algorithm, word_size_bits // 8, dict_size, num_low_bits))
+    for algorithm in algorithms:
+        if algorithm not in WK_ALGORITHMS:
+            configs.append((algorithm, None, None, None))
+    return configs
+
+
+def decode_trace(trace, directory = None):
+    """Return the path of an uncompressed copy of the trace and whether it is a temporary file"""
+    if os.path.isfile(trace) and not trace_reader.is_xz(trace):
+        return trace, False
+    fd, path = tempfile.mkstemp(suffix = ".trace", dir = directory)
+    with os.fdopen(fd, 'wb') as out:
+        for _, records in trace_reader.read_chunks(trace):
+            out.write(records)
+    return path, True
+
+
+def evaluate_page(page, configs, compressors):
+    """Return the compressed size of a page under every configuration
+
+    Words are split once per word size and the WK sections once per WK
+    configuration, then shared between 'wk' and 'wk-huffman'. When only
+    the 'wk' size of a configuration is needed it is estimated from the
+    tag counts without building the sections.
+    """
+    sizes = np.zeros(len(configs), dtype = np.int64)
+    words = dict()
+    sections = dict()
+    huffman_keys = {config[1:] for config in configs if config[0] == "wk-huffman"}
+    for n, (algorithm, word_size_bytes, dict_size, num_low_bits) in enumerate(configs):
+        if algorithm == "lzma":
+            sizes[n] = len(lzma.compress(page))
+            continue
+        elif algorithm == "bzip":
+            sizes[n] = len(bz2.compress(page))
+            continue
+
+        key = (word_size_bytes, dict_size, num_low_bits)
+        compressor = compressors[key]
+        if word_size_bytes not in words:
+            words[word_size_bytes] = compressor._to_words(page)
+        src_words = words[word_size_bytes]
+        if key not in huffman_keys:
+            sizes[n] = compressor._section_sizes(len(src_words), compressor._count_tags(src_words)).total
+            continue
+
+        if key not in sections:
+            tags, full_words, dict_indices, low_bits = compressor._encode(src_words)
+            sections[key] = compressor._pack_sections(len(src_words), tags, full_words, dict_indices, low_bits)
+
+        if algorithm == "wk":
+            sizes[n] = sum(len(section) for section in sections[key])
+        else:
+            sizes[n] = len(huffman.compress(b"".join(sections[key])))
+    return sizes
+
+
+def _make_compressors(configs, associativity = None):
+    return {(word_size_bytes, dict_size, num_low_bits) :
+            WKCompressor(word_size_bytes = word_size_bytes, dict_size = dict_size, num_low_bits = num_low_bits,
+                         associativity = associativity if associativity is None or associativity <= dict_size
+                         else dict_size)
+            for algorithm, word_size_bytes, dict_size, num_low_bits in configs
+            if algorithm in WK_ALGORITHMS}
+
+
+def _init_worker(path, configs, associativity = None):
+    global _records, _configs, _compressors
+    _configs = configs
+    _compressors = _make_compressors(configs, associativity)
+    if path is not None:
+        num_records = os.path.getsize(path) // RECORD_SIZE_BYTES
+        _records = np.memmap(path, dtype = np.uint8, mode = 'r', shape = (num_records, RECORD_SIZE_BYTES))
+
+
+def _sweep_range(start, stop):
+    """Return the total compressed size of pages start to stop under every configuration"""
+    totals = np.zeros(len(_configs), dtype = np.int64)
+    for n in range(start, stop):
+        page = _records[n, RECORD_HEADER_BYTES:].tobytes()
+        totals += evaluate_page(page, _configs, _compressors)
+    return totals
+
+
+def _evaluate_pages(pages):
+    """Return the compressed size of each page under every configuration, one row per page"""
+    return np.array([evaluate_page(page, _configs, _compressors) for page in pages], dtype = np.int64)
+
+
+def sweep(trace, configs, workers = None, batch_size = 64, max_pages = None, associativity = None):
+    """Evaluate every configuration against every page of a trace and return one row per configuration
+
+    associativity selects the WK dictionary policy as for WKCompressor;
+    dictionaries smaller than it are fully associative hashed ones.
+    """
+    path, temporary = decode_trace(trace)
+    try:
+        num_pages = os.path.getsize(path) // RECORD_SIZE_BYTES
+        if max_pages is not None:
+            num_pages = min(num_pages, max_pages)
+        starts = range(0, num_pages, batch_size)
+        stops = [min(start + batch_size, num_pages) for start in starts]
+
+        totals = np.zeros(len(configs), dtype = np.int64)
+        with ProcessPoolExecutor(max_workers = workers, initializer = _init_worker,
+                                 initargs = (path, configs, associativity)) as pool:
+            for batch_totals in pool.map(_sweep_range, starts, stops):
+                totals += batch_totals
+    finally:
+        if temporary:
+            os.remove(path)
+
+    return _rows(configs, num_pages, totals, associativity)
+
+
+def _rows(configs, num_pages, totals, associativity = None):
+    uncompressed_bytes = num_pages * (RECORD_SIZE_BYTES - RECORD_HEADER_BYTES)
+    rows = list()
+    for (algorithm, word_size_bytes, dict_size, num_low_bits), compressed_bytes in zip(configs, totals.tolist()):
+        rows.append({"algorithm" : algorithm,
+                     "word_size_bits" : word_size_bytes * 8 if word_size_bytes else None,
+                     "dict_size" : dict_size,
+                     "num_low_bits" : num_low_bits,
+                     "associativity" : None if dict_size is None or associativity is None else min(associativity, dict_size),
+                     "pages" : num_pages,
+                     "uncompressed_bytes" : uncompressed_bytes,
+                     "compressed_bytes" : compressed_bytes,
+                     "ratio" : compressed_bytes / uncompressed_bytes if uncompressed_bytes else None})
+    return rows
+
+
+def sample_sweep(trace, configs, max_pages, precision = None, confidence = sampling.DEFAULT_CONFIDENCE, workers = None,
+                 batch_size = 64, associativity = None, seed = None):
+    """Evaluate every configuration against a random sample of pages and return one row per configuration
+
+    Each row also holds the confidence interval of the ratio. Without a
+    precision the whole sample of up to max_pages pages is evaluated.
+    With one, the sample grows round by round and stops as soon as every
+    interval is at most precision either side of its ratio.
+    """
+    sample = sampling.PageSample(trace, max_pages, seed)
+    page_size = RECORD_SIZE_BYTES - RECORD_HEADER_BYTES
+    sizes = np.zeros((0, len(configs)), dtype = np.int64)
+    intervals = [(None, None)] * len(configs)
+    with ProcessPoolExecutor(max_workers = workers, initializer = _init_worker,
+                             initargs = (None, configs, associativity)) as pool:
+        while len(sizes) < len(sample):
+            stop = len(sample) if precision is None else min(max(2 * len(sizes), FIRST_ROUND_PAGES), len(sample))
+            pages = sample.pages(len(sizes), stop)
+            batches = [pages[start : start + batch_size] for start in range(0, len(pages), batch_size)]
+            sizes = np.concatenate([sizes] + list(pool.map(_evaluate_pages, batches)))
+            intervals = [sampling.confidence_interval(sizes[:, n] / page_size, confidence, sample.num_records)
+                         for n in range(len(configs))]
+            if precision is not None and max(half_width for _, half_width in intervals) <= precision:
+                break
+
+    rows = _rows(configs, len(sizes), sizes.sum(axis = 0), associativity)
+    for row, (_, half_width) in zip(rows, intervals):
+        if row["ratio"] is not None:
+            row["ratio_low"] = row["ratio"] - half_width
+            row["ratio_high"] = row["ratio"] + half_width
+        row["trace_pages"] = sample.num_records
+    return rows
+
+
+def write_results(rows, out, fieldnames = RESULT_FIELDS):
+    """Write sweep results as a CSV table with one row per configuration"""
+    writer = csv.DictWriter(out, fieldnames = fieldnames)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Evaluate a grid of compressor configurations against a trace in one pass")
+    parser.add_argument("trace")
+    parser.add_argument("--word-sizes", type = int, nargs = "+", default = WORD_SIZES_BITS,
+                        help = "word sizes in bits")
+    parser.add_argument("--dict-sizes", type = int, nargs = "+", default = DICT_SIZES)
+    parser.add_argument("--low-bits", type = int, nargs = "+", default = LOW_BITS)
+    parser.add_argument("--algorithms", nargs = "+", default = WK_ALGORITHMS + OTHER_ALGORITHMS,
+                        choices = WK_ALGORITHMS + OTHER_ALGORITHMS)
+    parser.add_argument("--workers", type = int, default = None,
+                        help = "number of worker processes (default: one per core)")
+    parser.add_argument("--batch-size", type = int, default = 64,
+                        help = "number of pages handed to a worker at a time")
+    parser.add_argument("--max-pages", type = int, default = None,
+                        help = "only evaluate the first MAX_PAGES pages")
+    parser.add_argument("--sample", type = int, default = None, metavar = "PAGES",
+                        help = "evaluate a random sample of up to PAGES pages from across the trace "
+                               "and report confidence intervals")
+    parser.add_argument("--precision", type = float, default = None,
+                        help = "with --sample, stop sampling once every ratio is known to within PRECISION")
+    parser.add_argument("--confidence", type = float, default = sampling.DEFAULT_CONFIDENCE,
+                        help = "confidence level of the intervals")
+    parser.add_argument("--seed", type = int, default = None, help = "seed of the random sample")
+    parser.add_argument("--associativity", type = int, default = None,
+                        help = "use hashed WK dictionaries with this many entries per set (default: LRU)")
+    parser.add_argument("--out", default = None, help = "CSV file to write (default: stdout)")
+    args = parser.parse_args(argv)
+    if args.precision is not None and args.sample is None:
+        parser.error("--precision needs --sample")
+    if args.sample is not None and args.max_pages is not None:
+        parser.error("--sample cannot be combined with --max-pages")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    configs = make_grid(args.word_sizes, args.dict_sizes, args.low_bits, args.algorithms)
+    if args.sample is None:
+        rows = sweep(args.trace, configs, workers = args.workers, batch_size = args.batch_size,
+                     max_pages = args.max_pages, associativity = args.associativity)
+        fieldnames = RESULT_FIELDS
+    else:
+        rows = sample_sweep(args.trace, configs, args.sample, args.precision, args.confidence, workers = args.workers,
+                            batch_size = args.batch_size, associativity = args.associativity, seed = args.seed)
+        fieldnames = SAMPLE_FIELDS
+    if args.out is None:
+        write_results(rows, sys.stdout, fieldnames)
+    else:
+        with open(args.out, 'w', newline = '') as out:
+            write_results(rows, out, fieldnames)
@@ -0,0 +1,57 @@
+'''
+Created on Oct 16, 2026
+
+Tests that the vectorized bit packing matches the scalar packing loops
+WKCompressor used before it, run with pytest.
+'''
+
+import random
+import pytest
+import bitpack
+
+BITS_PER_BYTE = 8
+
+
+def _scalar_pack(unpacked, data_size, packing_word_bytes):
+    reps = (packing_word_bytes * BITS_PER_BYTE) // data_size
+    packed = bytearray()
+    for n in range(0, len(unpacked), reps):
+        shift = packing_word_bytes * BITS_PER_BYTE - data_size
+        tmp = 0
+        for r, value in enumerate(unpacked[n : n+reps]):
+            tmp |= value << (shift - data_size * r)
+        packed += tmp.to_bytes(packing_word_bytes, byteorder = "big")
+    return bytes(packed)
+
+
+def _scalar_unpack(packed, data_size, packing_word_bytes):
+    unused_bits = (packing_word_bytes * BITS_PER_BYTE) % data_size
+    reps = (packing_word_bytes * BITS_PER_BYTE) // data_size
+    unpacked = list()
+    for n in range(0, len(packed), packing_word_bytes):
+        tmp = int.from_bytes(packed[n : n+packing_word_bytes], byteorder = "big")
+        for i in reversed(range(reps)):
+            unpacked.append((tmp >> (data_size * i + unused_bits)) & ((1 << data_size) - 1))
+    return unpacked
+
+
+@pytest.mark.parametrize("packing_word_bytes", [1, 2, 4, 8])
+def test_matches_scalar_packing(packing_word_bytes):
+    rng = random.Random(packing_word_bytes)
+    for data_size in range(1, packing_word_bytes * BITS_PER_BYTE + 1):
+        for num_values in [0, 1, 7, 64, 509]:
+            values = [rng.getrandbits(data_size) for _ in range(num_values)]
+            packed = bitpack.pack(values, data_size, packing_word_bytes).tobytes()
+            assert packed == _scalar_pack(values, data_size, packing_word_bytes)
+            assert len(packed) == bitpack.packed_size(num_values, data_size, packing_word_bytes)
+
+            unpacked = bitpack.unpack(packed, data_size, packing_word_bytes).tolist()
+            assert unpacked == _scalar_unpack(packed, data_size, packing_word_bytes)
+            assert unpacked[:num_values] == values
+
+
+def test_rejects_fields_wider_than_the_packing_word():
+    with pytest.raises(ValueError):
+        bitpack.pack([1], 17, 2)
+    with pytest.raises(ValueError):
+        bitpack.unpack(b"\x00\x00", 0, 2)
@@ -0,0 +1,105 @@
+'''
+Created on Oct 16, 2026
+
+Tests that a checkpointed run resumed part way through a trace records
+the same results as an uninterrupted run, run with pytest.
+'''
+
+import json
+import lzma
+import shutil
+import numpy as np
+import pytest
+import cluster_tester
+import results
+from checkpoint import CheckpointedResults, STATE_SUFFIX
+from trace_reader import RECORD_HEADER_BYTES
+from wk import PAGE_SIZE_BYTES
+
+NUM_PAGES = 600
+BATCH_SIZE = 32
+CHUNK_PAGES = 64
+
+
+class Preempted(Exception):
+    pass
+
+
+def _records():
+    # Pages of words drawn from a small vocabulary mixed with random words
+    # compress poorly enough that the decoder returns short outputs
+    rng = np.random.RandomState(7)
+    vocabulary = rng.randint(0, 2**63, size = 64, dtype = np.uint64)
+    records = bytearray()
+    for n in range(NUM_PAGES):
+        words = vocabulary[rng.randint(0, len(vocabulary), size = PAGE_SIZE_BYTES // 8)]
+        noise = rng.rand(len(words)) < 0.3
+        words[noise] = rng.randint(0, 2**63, size = int(noise.sum()), dtype = np.uint64)
+        records += (n * PAGE_SIZE_BYTES).to_bytes(RECORD_HEADER_BYTES, byteorder = "big") + words.tobytes()
+    return bytes(records)
+
+
+def _write_xz_trace(path):
+    with open(path, 'wb') as f:
+        f.write(lzma.compress(_records()))
+
+
+def _run(trace, path, algorithm):
+    config = {"algorithm" : algorithm}
+    checkpointed = CheckpointedResults(str(path), str(trace), config, CHUNK_PAGES)
+    cluster_tester.run(str(trace), algorithm, workers = 1, batch_size = BATCH_SIZE, results = checkpointed)
+    checkpointed.close()
+
+
+def test_resumed_xz_run_matches_uninterrupted_run(tmp_path):
+    trace = tmp_path / "trace.xz"
+    _write_xz_trace(trace)
+    algorithm = "wk-huffman-shared"
+    uninterrupted = tmp_path / "uninterrupted.bin"
+    _run(trace, uninterrupted, algorithm)
+
+    # Preempt a copy of the run after its third checkpoint, with part of
+    # the next chunk already written
+    resumed = tmp_path / "resumed.bin"
+    shutil.copy(str(uninterrupted), str(resumed))
+    with open(str(resumed) + STATE_SUFFIX, 'w') as f:
+        json.dump({"pages_done" : 3 * CHUNK_PAGES, "complete" : False}, f)
+    _run(trace, resumed, algorithm)
+
+    _, expected = results.open_results(str(uninterrupted))
+    _, actual = results.open_results(str(resumed))
+    assert len(expected) == NUM_PAGES
+    np.testing.assert_array_equal(actual["header"], expected["header"])
+    np.testing.assert_array_equal(actual["size"], expected["size"])
+
+
+def test_run_preempted_between_chunk_and_checkpoint_resumes(tmp_path, monkeypatch):
+    trace = tmp_path / "trace.bin"
+    with open(str(trace), 'wb') as f:
+        f.write(_records())
+    algorithm = "wk"
+    uninterrupted = tmp_path / "uninterrupted.bin"
+    _run(trace, uninterrupted, algorithm)
+
+    # The fifth chunk reaches the results file but the job is preempted
+    # before its checkpoint, so the resumed run has to redo it
+    checkpoint = CheckpointedResults._checkpoint
+    def preempted_checkpoint(self):
+        if self.pages_done == 5 * CHUNK_PAGES:
+            raise Preempted()
+        checkpoint(self)
+    monkeypatch.setattr(CheckpointedResults, "_checkpoint", preempted_checkpoint)
+    resumed = tmp_path / "resumed.bin"
+    with pytest.raises(Preempted):
+        _run(trace, resumed, algorithm)
+    monkeypatch.undo()
+    with open(str(resumed) + STATE_SUFFIX) as f:
+        assert json.load(f) == {"pages_done" : 4 * CHUNK_PAGES, "complete" : False}
+    _run(trace, resumed, algorithm)
+
+    with open(str(uninterrupted), 'rb') as f:
+        expected = f.read()
+    with open(str(resumed), 'rb') as f:
+        assert f.read() == expected
+    with open(str(resumed) + STATE_SUFFIX) as f:
+        assert json.load(f) == {"pages_done" : NUM_PAGES, "complete" : True}
@@ -0,0 +1,43 @@
+'''
+Created on Oct 16, 2026
+
+Round trip tests of the zero-page and duplicate-page front stage, run with pytest.
+'''
+
+import random
+import dedup
+from dedup import DedupCompressor, ZERO_PAGE, DUPLICATE, COMPRESSED
+from wk import WKCompressor, PAGE_SIZE_BYTES
+
+
+def _pages():
+    rng = random.Random(4)
+    distinct = [bytes(rng.choice([0, 1, 9, 200]) for _ in range(PAGE_SIZE_BYTES)) for _ in range(6)]
+    # Repeats both within and beyond a cache of 3 pages, refreshed by use
+    order = [0, 1, None, 0, 2, 3, 1, 0, 4, 5, None, 0, 2, 2, 5]
+    return [bytes(PAGE_SIZE_BYTES) if n is None else distinct[n] for n in order]
+
+
+def test_round_trip_with_a_small_cache():
+    wk = WKCompressor()
+    compressor = DedupCompressor(wk.compress, wk.decompress, cache_pages = 3)
+    decompressor = DedupCompressor(wk.compress, wk.decompress, cache_pages = 3)
+    pages = _pages()
+    compressed = [compressor.compress(page) for page in pages]
+    assert [bytes(decompressor.decompress(page)) for page in compressed] == pages
+
+    kinds = [page[0] for page in compressed]
+    assert kinds == [COMPRESSED, COMPRESSED, ZERO_PAGE, DUPLICATE, COMPRESSED, COMPRESSED, COMPRESSED,
+                     COMPRESSED, COMPRESSED, COMPRESSED, ZERO_PAGE, DUPLICATE, COMPRESSED, DUPLICATE, DUPLICATE]
+    for kind, page, compressed_page in zip(kinds, pages, compressed):
+        compressed_size = len(wk.compress(page)) if kind == COMPRESSED else 0
+        assert len(compressed_page) == dedup.encoded_size(kind, compressed_size)
+    assert compressor.stage.zero_pages == 2
+    assert compressor.stage.duplicate_pages == 4
+    assert compressor.stage.short_circuited_bytes == 6 * PAGE_SIZE_BYTES
+
+
+def test_zero_page_of_any_length():
+    assert dedup.is_zero_page(bytes(12))
+    assert dedup.is_zero_page(bytes(13))
+    assert not dedup.is_zero_page(bytes(12) + b"\x01")
@@ -0,0 +1,115 @@
+'''
+Created on Oct 16, 2026
+
+Tests of Huffman code construction, encoding and decoding, run with pytest.
+'''
+
+import heapq
+import random
+import numpy as np
+import pytest
+import huffman
+
+
+def _sources():
+    rng = random.Random(1)
+    yield b""
+    yield b"\x07"
+    yield b"\x00" * 4096
+    yield bytes(range(256))
+    yield bytes(rng.getrandbits(8) for _ in range(4096))
+    # Skewed towards a few values, as in WK pages
+    yield bytes(rng.choice([0, 0, 0, 1, 2, 255]) if rng.random() < 0.9 else rng.getrandbits(8) for _ in range(4096))
+
+
+def _heap_code_cost(histogram):
+    # Total coded bits of a Huffman tree built by repeatedly merging the two lightest nodes
+    weights = [int(weight) for weight in histogram if weight]
+    if len(weights) <= 1:
+        return sum(weights)
+    heapq.heapify(weights)
+    cost = 0
+    while len(weights) > 1:
+        merged = heapq.heappop(weights) + heapq.heappop(weights)
+        cost += merged
+        heapq.heappush(weights, merged)
+    return cost
+
+
+def _histograms():
+    rng = np.random.RandomState(2)
+    for source in _sources():
+        yield huffman.byte_histogram(source)
+    for num_symbols in [2, 3, 17, 256]:
+        histogram = np.zeros(256, dtype = np.int64)
+        histogram[rng.choice(256, num_symbols, replace = False)] = rng.randint(1, 1000, size = num_symbols)
+        yield histogram
+    # Equal weights make ties in every merge
+    yield np.full(256, 5)
+
+
+@pytest.mark.parametrize("source", list(_sources()))
+def test_table_decoder_matches_bit_by_bit_decoding(source):
+    compressed = huffman.compress(source)
+    assert bytes(huffman.decompress(compressed)) == source
+    if source:
+        # Decode the same bits by walking the code one bit at a time
+        codebook = huffman._create_codebook(huffman.byte_histogram(source))
+        coded = huffman.bitarray()
+        coded.frombytes(bytes(compressed[132:]))
+        num_bits = int.from_bytes(compressed[:4], byteorder = "big")
+        assert bytes(coded[:num_bits].decode(codebook)) == source
+
+
+def test_invalid_code_is_rejected():
+    # A lone symbol with the two bit code 00, followed by bits no code starts with
+    lengths = bytearray(128)
+    lengths[0] = 0x20
+    with pytest.raises(ValueError):
+        huffman._decode(b"\xff", 8, bytes(lengths))
+
+
+@pytest.mark.parametrize("histogram", list(_histograms()))
+def test_code_lengths_are_optimal(histogram):
+    lengths = huffman.code_lengths(histogram)
+    used = np.flatnonzero(histogram)
+    assert np.array_equal(np.flatnonzero(lengths), used)
+    if len(used) > 1:
+        # A complete prefix code of minimal total length
+        assert sum(2.0 ** -lengths[used]) == 1
+        assert int((lengths * histogram).sum()) == _heap_code_cost(histogram)
+
+
+def _fibonacci_source(num_symbols):
+    # Fibonacci frequencies give the deepest Huffman tree, one level per symbol
+    counts = [1, 1]
+    while len(counts) < num_symbols:
+        counts.append(counts[-1] + counts[-2])
+    source = b"".join(bytes([symbol]) * count for symbol, count in enumerate(counts))
+    return bytes(random.Random(3).sample(source, len(source)))
+
+
+@pytest.mark.parametrize("max_length", [8, 11, huffman.MAX_CODE_LENGTH])
+def test_code_lengths_are_limited(max_length):
+    source = _fibonacci_source(24)
+    histogram = huffman.byte_histogram(source)
+    assert huffman.code_lengths(histogram).max() == 23
+
+    lengths = huffman.code_lengths(histogram, max_length)
+    used = np.flatnonzero(histogram)
+    assert lengths.max() == max_length
+    assert sum(2.0 ** -lengths[used]) == 1
+    assert bytes(huffman.decompress(huffman.compress(source, max_length = max_length))) == source
+
+
+def test_package_merge_is_optimal_when_the_limit_is_not_reached():
+    for histogram in _histograms():
+        weights = np.sort(histogram[histogram > 0])
+        if len(weights) > 1:
+            lengths = huffman._package_merge(weights, int(huffman.code_lengths(weights).max()))
+            assert int((lengths * weights).sum()) == _heap_code_cost(weights)
+
+
+def test_every_byte_value_fits_the_shortest_limit():
+    lengths = huffman.code_lengths(huffman.byte_histogram(_fibonacci_source(24) + bytes(range(256))), 8)
+    assert lengths.tolist() == [8] * 256
@@ -0,0 +1,64 @@
+'''
+Created on Oct 16, 2026
+
+Tests of writing, reopening and reading page stores, run with pytest.
+'''
+
+import os
+import pytest
+from page_store import PageStore, PageStoreWriter, INDEX_SUFFIX, DATA_HEADER_BYTES
+
+
+def _pages(count):
+    return [bytes([n]) * 64 + bytes(range(n, n + 64)) for n in range(count)]
+
+
+def test_reopen_drops_index_records_past_the_data(tmp_path):
+    path = str(tmp_path / "store")
+    pages = _pages(4)
+    with PageStoreWriter(path) as writer:
+        for n, page in enumerate(pages):
+            writer.add(page, "raw", header = n)
+
+    # The index of the last page reached the disk but half of its data did not
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - len(pages[-1]) // 2)
+    with PageStoreWriter(path) as writer:
+        assert len(writer) == 3
+        assert os.path.getsize(path) == DATA_HEADER_BYTES + sum(len(page) for page in pages[:3])
+        writer.add(pages[3], "raw", header = 3)
+
+    with PageStore(path) as store:
+        assert len(store) == 4
+        assert [store.decompress(n) for n in range(4)] == pages
+        assert [store.header(n) for n in range(4)] == list(range(4))
+
+
+def test_reopen_without_index_keeps_only_the_header(tmp_path):
+    path = str(tmp_path / "store")
+    with PageStoreWriter(path) as writer:
+        writer.add(_pages(1)[0], "raw")
+    os.remove(path + INDEX_SUFFIX)
+    with PageStoreWriter(path) as writer:
+        assert len(writer) == 0
+    assert os.path.getsize(path) == DATA_HEADER_BYTES
+
+
+def test_close_with_a_live_view_leaves_the_store_usable(tmp_path):
+    path = str(tmp_path / "store")
+    pages = _pages(2)
+    with PageStoreWriter(path) as writer:
+        for page in pages:
+            writer.add(page, "raw")
+
+    store = PageStore(path)
+    view = store.get(0)
+    with pytest.raises(BufferError):
+        store.close()
+    assert bytes(view) == pages[0]
+    assert bytes(store.get(1)) == pages[1]
+    assert store.decompress(1) == pages[1]
+
+    view.release()
+    store.close()
+    assert store.index is None
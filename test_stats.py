@@ -0,0 +1,30 @@
+'''
+Created on Oct 16, 2026
+
+Tests of summarizing and comparing runs, run with pytest.
+'''
+
+import numpy as np
+import results
+import stats
+
+
+def _run(algorithm, word_size_bytes, sizes):
+    config = {"word_size_bytes" : word_size_bytes, "dict_size" : 16, "num_low_bits" : 10,
+              "algorithm" : algorithm, "page_size_bytes" : 4096}
+    records = np.zeros(len(sizes), dtype = results.RESULT_DTYPE)
+    records["size"] = sizes
+    return config, records
+
+
+def test_adaptive_runs_of_different_word_sizes_are_kept_apart():
+    runs = [_run("adaptive", 4, [100, 200]), _run("adaptive", 8, [300, 400])]
+    keys = [stats.run_key(config) for config, _ in runs]
+    assert keys == [("adaptive", 32, 16, 10), ("adaptive", 64, 16, 10)]
+    assert [stats.summarize(config, records)["word_size_bits"] for config, records in runs] == [32, 64]
+
+
+def test_baseline_named_by_algorithm_alone():
+    runs = [_run("lzma", 8, [100, 100]), _run("wk", 8, [200, 50])]
+    rows = stats.compare(runs, ("lzma", None, None, None))
+    assert rows == [(("lzma", 64, 16, 10), 1.0, 0.0), (("wk", 64, 16, 10), 1.25, 0.5)]
@@ -0,0 +1,75 @@
+'''
+Created on Oct 16, 2026
+
+Tests of reading raw and xz traces in chunks and at random, run with pytest.
+'''
+
+import lzma
+import numpy as np
+import pytest
+import trace_reader
+import sampling
+from trace_reader import RECORD_SIZE_BYTES, RECORD_HEADER_BYTES
+
+NUM_RECORDS = 300
+
+
+@pytest.fixture
+def records():
+    rng = np.random.RandomState(3)
+    data = bytearray()
+    for n in range(NUM_RECORDS):
+        words = rng.randint(0, 16, size = (RECORD_SIZE_BYTES - RECORD_HEADER_BYTES) // 8).astype(np.uint64)
+        data += (4096 * n).to_bytes(RECORD_HEADER_BYTES, byteorder = "big") + words.tobytes()
+    return bytes(data)
+
+
+def _write(path, data):
+    with open(str(path), 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def test_single_block_xz_is_streamed(tmp_path, records, monkeypatch):
+    trace = _write(tmp_path / "trace.xz", lzma.compress(records))
+    assert len(trace_reader.xz_blocks(trace)) == 1
+    assert not trace_reader.seekable(trace)
+
+    # Decoding the one block would hold the whole trace in memory
+    def decode_block(f, block):
+        raise AssertionError("a single block trace was decoded whole")
+    monkeypatch.setattr(trace_reader, "_decode_block", decode_block)
+
+    indices = [0, 7, 150, NUM_RECORDS - 1]
+    pages = list(trace_reader.read_records(trace, indices))
+    assert [page.index for page in pages] == indices
+    for page in pages:
+        record = records[page.index * RECORD_SIZE_BYTES : (page.index+1) * RECORD_SIZE_BYTES]
+        assert page.header == int.from_bytes(record[:RECORD_HEADER_BYTES], byteorder = "big")
+        assert bytes(page.data) == record[RECORD_HEADER_BYTES:]
+
+    raw_sample = sampling.PageSample(_write(tmp_path / "trace.bin", records), 40, seed = 5)
+    xz_sample = sampling.PageSample(trace, 40, seed = 5)
+    assert xz_sample.pages(0, len(xz_sample)) == raw_sample.pages(0, len(raw_sample))
+
+
+@pytest.mark.parametrize("encoding", ["raw", "xz", "concatenated xz"])
+def test_chunks_hold_exact_record_counts(tmp_path, records, encoding):
+    if encoding == "raw":
+        trace = _write(tmp_path / "trace.bin", records)
+    elif encoding == "xz":
+        trace = _write(tmp_path / "trace.xz", lzma.compress(records))
+    else:
+        # Two streams split in the middle of a record, decoded one after the other like unxz does
+        split = 101 * RECORD_SIZE_BYTES + 17
+        trace = _write(tmp_path / "trace.xz", lzma.compress(records[:split]) + lzma.compress(records[split:]))
+
+    size = RECORD_SIZE_BYTES
+    for start, stop, chunk_records in [(0, None, 32), (64 * size, None, 32), (5 * size + 3, 250 * size + 1, 100),
+                                       (100 * size, 101 * size, 7), (0, None, 1000)]:
+        chunks = list(trace_reader.read_chunks(trace, start, stop, chunk_records))
+        first = -(-start // size)
+        last = NUM_RECORDS if stop is None else min(NUM_RECORDS, -(-stop // size))
+        assert [index for index, _ in chunks] == list(range(first, last, chunk_records))
+        assert [len(chunk) // size for _, chunk in chunks[:-1]] == [chunk_records] * (len(chunks) - 1)
+        assert b"".join(bytes(chunk) for _, chunk in chunks) == records[first * size : last * size]
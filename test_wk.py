@@ -0,0 +1,150 @@
+'''
+Created on Oct 16, 2026
+
+Round trip tests of WKCompressor, run with pytest.
+'''
+
+import random
+import pytest
+from wk import WKCompressor, LRUDictionary, ZERO, PARTIAL, MISS, HIT
+
+
+def _page(seed, size = 4096):
+    rng = random.Random(seed)
+    return bytes(rng.choice([0, 1, 2, 3, 7, 255]) for _ in range(size))
+
+
+def _word_page(seed, word_size_bytes, size = 4096):
+    # Zero words and words sharing a few high parts, with a few low parts each
+    rng = random.Random(seed)
+    word_bits = 8 * word_size_bytes
+    high_parts = [rng.getrandbits(word_bits) for _ in range(24)]
+    low_parts = [rng.getrandbits(3) for _ in range(3)]
+    words = [0 if rng.random() < 0.2 else (rng.choice(high_parts) & ~0x7 | rng.choice(low_parts))
+             for _ in range(size // word_size_bytes)]
+    return b"".join(word.to_bytes(word_size_bytes, byteorder = "big") for word in words)
+
+
+def _scan_encode(words, dict_size, num_low_bits):
+    # The list scans of the LRU queue that WKCompressor used before LRUDictionary
+    lru_queue = [0]
+    encoded = list()
+    for word in words:
+        if word == 0:
+            encoded.append((ZERO, None))
+        elif word in lru_queue:
+            hit_index = lru_queue.index(word)
+            encoded.append((HIT, hit_index))
+            lru_queue.insert(0, lru_queue.pop(hit_index))
+        elif word >> num_low_bits in [entry >> num_low_bits for entry in lru_queue]:
+            hit_index = [entry >> num_low_bits for entry in lru_queue].index(word >> num_low_bits)
+            encoded.append((PARTIAL, hit_index))
+            if hit_index != 0:
+                lru_queue.pop(hit_index)
+                lru_queue.insert(0, word)
+        else:
+            encoded.append((MISS, None))
+            if len(lru_queue) == dict_size:
+                lru_queue.pop()
+            lru_queue.insert(0, word)
+    return encoded, lru_queue
+
+
+@pytest.mark.parametrize("word_size_bytes, num_low_bits", [(1, 10), (2, 17), (4, 33), (8, 64)])
+@pytest.mark.parametrize("associativity", [None, 1, 4])
+def test_round_trip_low_bits_wider_than_word(word_size_bytes, num_low_bits, associativity):
+    compressor = WKCompressor(word_size_bytes = word_size_bytes, dict_size = 16, num_low_bits = num_low_bits,
+                              associativity = associativity)
+    page = _page(word_size_bytes)
+    compressed = compressor.compress(page)
+    assert bytes(compressor.decompress(compressed)) == page
+    assert compressor.estimate(page).total == len(compressed)
+
+
+@pytest.mark.parametrize("word_size_bytes", [3, 4, 8])
+def test_compress_many_matches_compress(word_size_bytes):
+    compressor = WKCompressor(word_size_bytes = word_size_bytes, dict_size = 16, num_low_bits = 10)
+    page_size = 4096 - 4096 % word_size_bytes
+    pages = [_page(seed, page_size) for seed in range(4)] + [bytes(page_size)]
+    compressed, offsets = compressor.compress_many(b"".join(pages), page_size)
+    assert len(offsets) == len(pages) + 1
+    for n, page in enumerate(pages):
+        assert compressed[offsets[n] : offsets[n+1]] == compressor.compress(page)
+    assert bytes(compressor.decompress_many(compressed, offsets)) == b"".join(pages)
+
+
+@pytest.mark.parametrize("dict_size", [2, 16, 64])
+def test_lru_dictionary_matches_list_scan(dict_size):
+    rng = random.Random(dict_size)
+    # Few high parts and few low parts give plenty of hits, partial hits and evictions
+    words = [rng.randrange(40) << 10 | rng.choice([0, 1, 5, 1023]) for _ in range(5000)]
+    expected, expected_queue = _scan_encode(words, dict_size, 10)
+
+    dictionary = LRUDictionary(dict_size, 10)
+    assert [(ZERO, None) if word == 0 else dictionary.encode(word) for word in words] == expected
+    assert dictionary.queue == expected_queue
+
+    decoder = LRUDictionary(dict_size, 10)
+    for word, (tag, hit_index) in zip(words, expected):
+        if tag == HIT:
+            assert decoder.decode_hit(hit_index) == word
+        elif tag == PARTIAL:
+            assert decoder.decode_partial(hit_index, word & 1023) == word
+        elif tag == MISS:
+            decoder.decode_miss(word)
+    assert decoder.queue == expected_queue
+
+
+@pytest.mark.parametrize("word_size_bytes", [3, 4, 8])
+@pytest.mark.parametrize("associativity", [None, 4])
+def test_estimate_matches_compressed_sections(word_size_bytes, associativity):
+    compressor = WKCompressor(word_size_bytes = word_size_bytes, dict_size = 16, num_low_bits = 10,
+                              associativity = associativity)
+    with_stats = WKCompressor(word_size_bytes = word_size_bytes, dict_size = 16, num_low_bits = 10,
+                              associativity = associativity, debug = True)
+    for seed in range(3):
+        page = _page(seed, 4096 - 4096 % word_size_bytes)
+        src_words = compressor._to_words(page)
+        sections = compressor._pack_sections(len(src_words), *compressor._encode(src_words))
+        expected = [len(b"".join(sections))] + [len(section) for section in sections]
+        assert list(compressor.estimate(page)) == expected
+        assert list(with_stats.estimate(page)) == expected
+
+
+@pytest.mark.parametrize("word_size_bytes, num_low_bits", [(1, 3), (2, 6), (4, 6), (8, 6), (8, 64)])
+@pytest.mark.parametrize("associativity", [None, 1, 4])
+def test_prepass_matches_word_by_word_encoding(word_size_bytes, num_low_bits, associativity):
+    compressor = WKCompressor(word_size_bytes = word_size_bytes, dict_size = 16, num_low_bits = num_low_bits,
+                              associativity = associativity)
+    for seed in range(3):
+        src_words = compressor._to_words(_word_page(seed, word_size_bytes))
+        word_list = [int(word) for word in src_words]
+        tags, full_words, dict_indices, low_bits = compressor._encode(src_words)
+        expected = compressor._encode_list(word_list)
+        assert (tags, bytes(full_words), dict_indices, low_bits) == \
+            (expected[0], bytes(expected[1]), expected[2], expected[3])
+
+        index_counts = [0] * 16
+        expected_index_counts = [0] * 16
+        assert compressor._count_tags(src_words, index_counts) == \
+            compressor._count_tags(word_list, expected_index_counts)
+        assert index_counts == expected_index_counts
+
+
+@pytest.mark.parametrize("word_size_bytes", [3, 4, 8])
+@pytest.mark.parametrize("associativity", [None, 4])
+def test_decompress_into_preallocated_buffer(word_size_bytes, associativity):
+    compressor = WKCompressor(word_size_bytes = word_size_bytes, dict_size = 16, num_low_bits = 6,
+                              associativity = associativity)
+    page = _word_page(0, word_size_bytes)
+    compressed = compressor.compress(page)
+    assert bytes(compressor.decompress(compressed)) == page
+
+    # Stale contents of the buffer must not leak into the zero words
+    out = bytearray(b"\xff" * (len(page) + 16))
+    result = compressor.decompress(compressed, out = memoryview(out)[8 : 8+len(page)])
+    assert bytes(result) == page
+    assert out == b"\xff" * 8 + page + b"\xff" * 8
+
+    with pytest.raises(ValueError):
+        compressor.decompress(compressed, out = bytearray(len(page) + 1))
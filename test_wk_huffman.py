@@ -0,0 +1,29 @@
+'''
+Created on Oct 16, 2026
+
+Round trip tests of WKHuffmanCompressor, run with pytest.
+'''
+
+import numpy as np
+import pytest
+from wk_huffman import WKHuffmanCompressor
+
+
+def _page(seed, word_size_bytes):
+    # Words sharing a few high parts with varying low bits give every section something to code
+    rng = np.random.RandomState(seed)
+    num_words = 4096 // word_size_bytes
+    high = rng.randint(0, 8, size = num_words).astype(np.uint64) << np.uint64(8 * word_size_bytes - 8)
+    low = rng.randint(0, 2**31, size = num_words).astype(np.uint64) % np.uint64(2**min(8 * word_size_bytes - 8, 60))
+    words = high | low
+    words[rng.rand(num_words) < 0.2] = 0
+    return words.astype(">u" + str(word_size_bytes)).tobytes()
+
+
+@pytest.mark.parametrize("num_low_bits", [16, 31, 40])
+@pytest.mark.parametrize("word_size_bytes", [4, 8])
+def test_round_trip_wide_low_bits(word_size_bytes, num_low_bits):
+    compressor = WKHuffmanCompressor(word_size_bytes = word_size_bytes, dict_size = 16, num_low_bits = num_low_bits)
+    for seed in range(3):
+        page = _page(seed, word_size_bytes)
+        assert bytes(compressor.decompress(compressor.compress(page))) == page
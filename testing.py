@@ -7,7 +7,6 @@ from wk import WKCompressor
 import huffman
 import random
 import lzma, zlib, bz2
-from pip.commands.search import print_results
 
 def main():    
     patterns = [0x61083282abedbf10, 0xcccccccc55555555, 0x1234abcdf5ba03e7, 0x1234abcdf5ba0132, 0]
@@ -51,8 +50,8 @@ def main():
     bz_compressed = bz2.compress(src)
     bz_uncompressed = bz2.decompress(bz_compressed)
     
-    print("LRU Histogram: ", WKCompressor.get_lru_queue_histogram(compressor, wk_compressed))
-    indices = WKCompressor.get_dict(compressor, wk_compressed)
+    print("LRU Histogram: ", WKCompressor.create_lru_queue_histogram(compressor, wk_compressed))
+    indices = WKCompressor.get_lru_queue(compressor, wk_compressed)
     print(len(indices))
     
     print_results("WK", src, wk_compressed, wk_uncompressed)
@@ -0,0 +1,319 @@
+'''
+Created on Oct 16, 2026
+
+Streams page records out of memory traces. A trace is a sequence of
+records, each an 8 byte big-endian header followed by one page. Traces
+may be xz-compressed, in which case they are decompressed in-process
+with lzma.LZMADecompressor, or raw, in which case regular files are
+memory mapped and pipes are read in large chunks. Pages are handed back
+as memoryview slices of the decompressed chunk without further copying.
+
+Records can also be read at random. Raw traces are simply indexed, and
+xz traces written in several blocks (xz --block-size, or any threaded
+xz) are indexed by their blocks. The index at the end of every xz
+stream gives each block's offset and uncompressed size, so a record is
+read by decoding only the blocks that hold it.
+'''
+
+import os
+import mmap
+import lzma
+import zlib
+import bisect
+import itertools
+from collections import namedtuple
+from wk import PAGE_SIZE_BYTES
+
+RECORD_HEADER_BYTES = 8
+RECORD_SIZE_BYTES = RECORD_HEADER_BYTES + PAGE_SIZE_BYTES
+CHUNK_RECORDS = 1024
+
+# A page of a trace: its record number in the trace, its parsed header
+# and a memoryview of its contents
+Page = namedtuple("Page", 'index, header, data')
+
+XZ_MAGIC = b"\xfd7zXZ\x00"
+XZ_FOOTER_MAGIC = b"YZ"
+# Stream headers and footers are both this long
+XZ_HEADER_BYTES = 12
+
+# A block of an xz trace: its offset in the file and its size without
+# padding, where its contents start in the uncompressed trace and how
+# long they are, and the header of the stream the block belongs to
+XzBlock = namedtuple("XzBlock", 'offset, unpadded_size, uncompressed_offset, uncompressed_size, stream_header')
+
+
+def is_xz(trace):
+    """Return True if the trace file starts with the xz magic bytes"""
+    with open(trace, 'rb') as f:
+        return f.read(len(XZ_MAGIC)) == XZ_MAGIC
+
+
+def _round_up4(size):
+    return -(-size // 4) * 4
+
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        value |= (byte & 0x7F) << shift
+        pos += 1
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _varint(value):
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def xz_blocks(trace):
+    """Return the XzBlock of every block of an xz trace in order, or None if the trace cannot be indexed
+
+    The streams are walked from the end of the file back, reading the
+    index of each, so only the indexes and stream headers are read.
+    """
+    if not os.path.isfile(trace) or not is_xz(trace):
+        return None
+    streams = list()
+    with open(trace, 'rb') as f:
+        pos = f.seek(0, 2)
+        try:
+            while pos > 0:
+                # Skip the stream padding between concatenated streams
+                f.seek(pos - 4)
+                if f.read(4) == b"\0\0\0\0":
+                    pos -= 4
+                    continue
+                f.seek(pos - XZ_HEADER_BYTES)
+                footer = f.read(XZ_HEADER_BYTES)
+                if footer[-len(XZ_FOOTER_MAGIC):] != XZ_FOOTER_MAGIC:
+                    return None
+                index_size = (int.from_bytes(footer[4:8], byteorder = "little") + 1) * 4
+                index_start = pos - XZ_HEADER_BYTES - index_size
+                f.seek(index_start)
+                index = f.read(index_size)
+                num_blocks, index_pos = _read_varint(index, 1)
+                sizes = list()
+                for _ in range(num_blocks):
+                    unpadded_size, index_pos = _read_varint(index, index_pos)
+                    uncompressed_size, index_pos = _read_varint(index, index_pos)
+                    sizes.append((unpadded_size, uncompressed_size))
+                pos = index_start - sum(_round_up4(unpadded_size) for unpadded_size, _ in sizes) - XZ_HEADER_BYTES
+                f.seek(pos)
+                stream_header = f.read(XZ_HEADER_BYTES)
+                if pos < 0 or stream_header[:len(XZ_MAGIC)] != XZ_MAGIC:
+                    return None
+                streams.append((pos, stream_header, sizes))
+        except (OSError, IndexError):
+            # Truncated or not seekable
+            return None
+
+    blocks = list()
+    uncompressed_offset = 0
+    for pos, stream_header, sizes in reversed(streams):
+        offset = pos + XZ_HEADER_BYTES
+        for unpadded_size, uncompressed_size in sizes:
+            blocks.append(XzBlock(offset, unpadded_size, uncompressed_offset, uncompressed_size, stream_header))
+            offset += _round_up4(unpadded_size)
+            uncompressed_offset += uncompressed_size
+    return blocks
+
+
+def _decode_block(f, block):
+    """Decode one block of an xz trace on its own by wrapping it in a stream of its own"""
+    f.seek(block.offset)
+    data = f.read(_round_up4(block.unpadded_size))
+    index = b"\0" + _varint(1) + _varint(block.unpadded_size) + _varint(block.uncompressed_size)
+    index += b"\0" * (-len(index) % 4)
+    index += zlib.crc32(index).to_bytes(4, byteorder = "little")
+    footer = (len(index) // 4 - 1).to_bytes(4, byteorder = "little") + block.stream_header[len(XZ_MAGIC):len(XZ_MAGIC) + 2]
+    footer = zlib.crc32(footer).to_bytes(4, byteorder = "little") + footer + XZ_FOOTER_MAGIC
+    return lzma.decompress(block.stream_header + data + index + footer, format = lzma.FORMAT_XZ)
+
+
+def num_records(trace):
+    """Return the number of records in a trace, or None if it cannot be known without decoding it"""
+    if os.path.isfile(trace) and not is_xz(trace):
+        return os.path.getsize(trace) // RECORD_SIZE_BYTES
+    blocks = xz_blocks(trace)
+    if not blocks:
+        return None
+    return (blocks[-1].uncompressed_offset + blocks[-1].uncompressed_size) // RECORD_SIZE_BYTES
+
+
+def seekable(trace):
+    """Return True if records can be read at random without decoding the trace from the beginning"""
+    if os.path.isfile(trace) and not is_xz(trace):
+        return True
+    blocks = xz_blocks(trace)
+    return blocks is not None and len(blocks) > 1
+
+
+def _raw_chunks(f, chunk_size):
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _xz_chunks(f, chunk_size):
+    # Output is limited to chunk_size per call so that a highly compressible
+    # trace cannot expand into one huge buffer. Concatenated xz streams are
+    # decoded one after the other like unxz does.
+    decompressor = lzma.LZMADecompressor()
+    while True:
+        if decompressor.eof:
+            data = decompressor.unused_data
+            if not data:
+                data = f.read(chunk_size)
+                if not data:
+                    return
+            decompressor = lzma.LZMADecompressor()
+        elif decompressor.needs_input:
+            data = f.read(chunk_size)
+            if not data:
+                raise EOFError("Compressed trace ended before the end of the xz stream")
+        else:
+            data = b""
+        chunk = decompressor.decompress(data, max_length = chunk_size)
+        if chunk:
+            yield chunk
+
+
+def read_chunks(trace, start = 0, stop = None, chunk_records = CHUNK_RECORDS):
+    """Yield (index of first record, memoryview of whole records) for a byte range of a trace
+
+    The range is measured in uncompressed trace bytes, and a record belongs
+    to it if the record starts at or after start and before stop. Splitting
+    a trace into adjacent ranges therefore hands every record to exactly
+    one reader. Raw traces seek straight to the range; xz traces have to be
+    decoded from the beginning and the records before the range discarded.
+    """
+    first = -(-start // RECORD_SIZE_BYTES)
+    last = None if stop is None else -(-stop // RECORD_SIZE_BYTES)
+    with open(trace, 'rb') as f:
+        # Peek rather than read so that the magic bytes are not lost from pipes
+        if f.peek(len(XZ_MAGIC))[:len(XZ_MAGIC)] != XZ_MAGIC:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # Pipes and other streams cannot be mapped
+                mapped = None
+            if mapped is not None:
+                view = memoryview(mapped)
+                total = len(mapped) // RECORD_SIZE_BYTES
+                last = total if last is None else min(last, total)
+                for index in range(first, last, chunk_records):
+                    end = min(index + chunk_records, last)
+                    yield index, view[index * RECORD_SIZE_BYTES : end * RECORD_SIZE_BYTES]
+                return
+            chunks = _raw_chunks(f, chunk_records * RECORD_SIZE_BYTES)
+        else:
+            chunks = _xz_chunks(f, chunk_records * RECORD_SIZE_BYTES)
+
+        # Decoders and pipes hand back chunks of any length, so the data is 
+        # buffered until it holds chunk_records whole records. Every chunk 
+        # but the last then holds exactly chunk_records records from first 
+        # on, as with mapped traces, so callers that cut batches at chunk 
+        # boundaries cut them in the same places however the trace is read.
+        # Each buffer is a new bytes object, so views handed out earlier 
+        # stay valid.
+        chunk_bytes = chunk_records * RECORD_SIZE_BYTES
+        index = 0
+        buffered = b""
+        for chunk in itertools.chain(chunks, [None]):
+            if chunk is not None:
+                buffered = buffered + chunk if buffered else chunk
+            if index < first:
+                skip = min(first - index, len(buffered) // RECORD_SIZE_BYTES)
+                buffered = buffered[skip * RECORD_SIZE_BYTES:]
+                index += skip
+                if index < first:
+                    continue
+            while len(buffered) >= chunk_bytes or (chunk is None and len(buffered) >= RECORD_SIZE_BYTES):
+                num_records = min(chunk_records, len(buffered) // RECORD_SIZE_BYTES)
+                if last is not None:
+                    num_records = min(num_records, last - index)
+                if num_records <= 0:
+                    return
+                yield index, memoryview(buffered)[:num_records * RECORD_SIZE_BYTES]
+                buffered = buffered[num_records * RECORD_SIZE_BYTES:]
+                index += num_records
+            if last is not None and index >= last:
+                return
+
+
+def read_pages(trace, start = 0, stop = None, chunk_records = CHUNK_RECORDS):
+    """Yield a Page for every record in a byte range of a trace"""
+    for index, records in read_chunks(trace, start, stop, chunk_records):
+        for n in range(len(records) // RECORD_SIZE_BYTES):
+            record = records[n * RECORD_SIZE_BYTES : (n+1) * RECORD_SIZE_BYTES]
+            header = int.from_bytes(record[:RECORD_HEADER_BYTES], byteorder = "big")
+            yield Page(index + n, header, record[RECORD_HEADER_BYTES:])
+
+
+def read_records(trace, indices):
+    """Yield a Page for every record number in indices, in increasing order
+
+    Raw traces are memory mapped and xz traces of several blocks decode
+    just the blocks holding the records. Any other trace, including an xz
+    trace of a single block, is streamed from the beginning a chunk at a
+    time, keeping only the records wanted, so memory stays bounded 
+    however large the trace is.
+    """
+    indices = sorted(set(indices))
+    blocks = None
+    if not (os.path.isfile(trace) and not is_xz(trace)):
+        blocks = xz_blocks(trace)
+        if blocks is None or len(blocks) <= 1:
+            wanted = set(indices)
+            last = indices[-1] if indices else -1
+            for page in read_pages(trace, stop = (last + 1) * RECORD_SIZE_BYTES):
+                if page.index in wanted:
+                    yield page
+            return
+
+    with open(trace, 'rb') as f:
+        if blocks is None:
+            view = memoryview(mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ))
+            total = len(view) // RECORD_SIZE_BYTES
+            for index in indices:
+                if index >= total:
+                    return
+                record = view[index * RECORD_SIZE_BYTES : (index+1) * RECORD_SIZE_BYTES]
+                yield Page(index, int.from_bytes(record[:RECORD_HEADER_BYTES], byteorder = "big"),
+                           record[RECORD_HEADER_BYTES:])
+            return
+
+        # Records may straddle blocks, so the decoded blocks are kept until 
+        # the records move past them
+        starts = [block.uncompressed_offset for block in blocks]
+        decoded = dict()
+        for index in indices:
+            start = index * RECORD_SIZE_BYTES
+            stop = start + RECORD_SIZE_BYTES
+            first = bisect.bisect_right(starts, start) - 1
+            last = bisect.bisect_right(starts, stop - 1) - 1
+            if stop > blocks[-1].uncompressed_offset + blocks[-1].uncompressed_size:
+                return
+            for number in list(decoded):
+                if number < first:
+                    del decoded[number]
+            record = bytearray()
+            for number in range(first, last + 1):
+                if number not in decoded:
+                    decoded[number] = _decode_block(f, blocks[number])
+                block_start = starts[number]
+                record += decoded[number][max(start - block_start, 0) : stop - block_start]
+            record = memoryview(bytes(record))
+            yield Page(index, int.from_bytes(record[:RECORD_HEADER_BYTES], byteorder = "big"),
+                       record[RECORD_HEADER_BYTES:])
@@ -8,6 +8,12 @@ Provides class WKCompressor as implementation of WK algorithm
 
 import functools
 import math  
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import bitpack
 
 ZERO = 0
 PARTIAL = 1
@@ -17,14 +23,260 @@ BITS_PER_BYTE = 8
 PAGE_SIZE_BYTES = 4096
 TAGS_PER_PACKED_BYTE = 4
 HEADER_SIZE_BYTES = 16
+# The top byte of the first header word records the dictionary policy:
+# 0 for the fully associative LRU dictionary and log2(associativity) + 1
+# for a hashed dictionary. The rest of the word holds the number of words.
+POLICY_SHIFT = 24
+NUM_WORDS_MASK = (1 << POLICY_SHIFT) - 1
+LRU_POLICY = 0
+# Fibonacci hashing of the high bits picks the set of a hashed dictionary
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+HASH_MASK = (1 << 64) - 1
+
+# Big-endian NumPy dtypes for word sizes that can be converted in bulk
+_WORD_DTYPES = {1 : np.dtype('>u1'), 2 : np.dtype('>u2'),
+                4 : np.dtype('>u4'), 8 : np.dtype('>u8')}
+
+# Byte sizes of a compressed page and of each of its sections, as 
+# returned by WKCompressor.estimate()
+SectionSizes = namedtuple("SectionSizes", 'total, header, tags, full_words, dict_indices, low_bits')
+
+
+class WKStats():
+    """Running totals over the pages handled by a WKCompressor
+    
+    Attach one to a compressor with its stats argument (or by setting its 
+    stats attribute) to aggregate tag counts, section sizes, the histogram 
+    of dict indices and the time spent in each stage of compression and 
+    decompression. A compressor without one does no bookkeeping at all. 
+    Collectors from different processes can be combined with merge().
+    """
+    
+    def __init__(self, dict_size):
+        self.pages = 0
+        self.uncompressed_bytes = 0
+        self.tag_counts = np.zeros(4, dtype = np.int64)
+        self.section_bytes = np.zeros(len(SectionSizes._fields), dtype = np.int64)
+        self.dict_index_histogram = np.zeros(dict_size, dtype = np.int64)
+        self.decompressed_pages = 0
+        self.stage_seconds = dict()
+    
+    def add_page(self, num_bytes, tag_counts, sizes, dict_indices = None, index_counts = None):
+        """Add a compressed page given its tag counts, SectionSizes and either its dict indices or their counts"""
+        self.pages += 1
+        self.uncompressed_bytes += num_bytes
+        self.tag_counts += tag_counts
+        self.section_bytes += sizes
+        if dict_indices:
+            self.dict_index_histogram += np.bincount(dict_indices, minlength = len(self.dict_index_histogram))
+        elif index_counts is not None:
+            self.dict_index_histogram += index_counts
+    
+    def add_time(self, stage, seconds):
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+    
+    def merge(self, other):
+        """Add the totals of another WKStats into this one"""
+        self.pages += other.pages
+        self.uncompressed_bytes += other.uncompressed_bytes
+        self.tag_counts += other.tag_counts
+        self.section_bytes += other.section_bytes
+        self.dict_index_histogram += other.dict_index_histogram
+        self.decompressed_pages += other.decompressed_pages
+        for stage, seconds in other.stage_seconds.items():
+            self.add_time(stage, seconds)
+    
+    def section_sizes(self):
+        """Return the total SectionSizes of every page added"""
+        return SectionSizes(*self.section_bytes.tolist())
+    
+    def report(self):
+        """Return a printable summary of the totals"""
+        lines = ["Pages compressed:\t\t\t" + str(self.pages),
+                 "Pages decompressed:\t\t\t" + str(self.decompressed_pages)]
+        if self.pages:
+            lines.append("Achieved ratio:\t\t\t\t" + "{0:.4f}".format(self.section_bytes[0] / self.uncompressed_bytes))
+            num_tags = self.tag_counts.sum()
+            for name, tag in (("ZERO", ZERO), ("PARTIAL", PARTIAL), ("MISS", MISS), ("HIT", HIT)):
+                lines.append(name + " tags:\t\t\t\t" + str(self.tag_counts[tag]) 
+                             + "\t({0:.2%})".format(self.tag_counts[tag] / num_tags))
+            for name, size in zip(SectionSizes._fields, self.section_bytes):
+                lines.append("Length of " + name + " area:\t\t" + str(size))
+            lines.append("Dict index histogram:\t\t\t" + str(self.dict_index_histogram.tolist()))
+        for stage, seconds in sorted(self.stage_seconds.items()):
+            lines.append("Time in " + stage + ":\t\t\t" + "{0:.3f}".format(seconds) + " s")
+        return "\n".join(lines)
+
+
+class LRUDictionary():
+    """Fully associative WK dictionary of recently seen words kept in LRU order
+    
+    The queue holds the dictionary words from most to least recently used, 
+    so a word's dict index is its position in the queue. No two entries 
+    ever share their high bits (a word only enters the queue on a miss of 
+    its high bits, or replaces the entry it partially matched), so a hash 
+    map from high bits to entry answers both the full and the partial 
+    match in one lookup. The position is then found with a list scan in C 
+    rather than by rebuilding a list of high bits in Python.
+    """
+    
+    def __init__(self, dict_size, num_low_bits):
+        self._dict_size = dict_size
+        self._num_low_bits = num_low_bits
+        self._high_bit_mask = ~((1 << num_low_bits) - 1)
+        self.queue = [0]
+        self._high_bits = {0 : 0}
+    
+    def encode(self, word, high_bits = None):
+        """Look up a nonzero word, update the recency order and return (tag, dict index)
+        
+        The high bits of the word can be passed in if already computed.
+        """
+        if high_bits is None:
+            high_bits = word >> self._num_low_bits
+        entry = self._high_bits.get(high_bits)
+        if entry is None:
+            if len(self.queue) == self._dict_size:
+                del self._high_bits[self.queue.pop() >> self._num_low_bits]
+            self.queue.insert(0, word)
+            self._high_bits[high_bits] = word
+            return MISS, None
+        
+        hit_index = self.queue.index(entry)
+        if entry == word:
+            if hit_index != 0:
+                self.queue.insert(0, self.queue.pop(hit_index))
+            return HIT, hit_index
+        
+        # Move the dictionary entry to the front of the queue and replace with new low bits
+        if hit_index != 0:
+            self.queue.pop(hit_index)
+            self.queue.insert(0, word)
+            self._high_bits[high_bits] = word
+        return PARTIAL, hit_index
+    
+    def decode_hit(self, hit_index):
+        """Return the dictionary word at hit_index and move it to the front"""
+        word = self.queue[hit_index]
+        if hit_index != 0:
+            self.queue.insert(0, self.queue.pop(hit_index))
+        return word
+    
+    def decode_partial(self, hit_index, low_bits):
+        """Return the word rebuilt from the entry at hit_index and low_bits"""
+        word = (self.queue[hit_index] & self._high_bit_mask) | low_bits
+        if hit_index != 0:
+            self.queue.pop(hit_index)
+            self.queue.insert(0, word)
+        return word
+    
+    def decode_miss(self, word):
+        """Add a word read from the full words area to the front of the dictionary"""
+        if len(self.queue) == self._dict_size:
+            self.queue.pop()
+        self.queue.insert(0, word)
+
+
+class HashedDictionary():
+    """Set-associative WK dictionary indexed by a hash of the high bits, as in WKdm
+    
+    The dictionary is split into dict_size // associativity sets, and a 
+    word can only be stored in the set its high bits hash to. A lookup 
+    therefore scans at most associativity entries, and an associativity 
+    of 1 gives the direct-mapped dictionary of WKdm. Each set is kept in 
+    LRU order, and a word's dict index is the first index of its set 
+    plus its position within the set. Unlike LRUDictionary, a PARTIAL 
+    match always takes on the low bits of the new word.
+    """
+    
+    def __init__(self, dict_size, num_low_bits, associativity = 1):
+        self._num_low_bits = num_low_bits
+        self._high_bit_mask = ~((1 << num_low_bits) - 1)
+        self._ways = associativity
+        self._way_bits = associativity.bit_length() - 1
+        self._hash_shift = 64 - ((dict_size // associativity).bit_length() - 1)
+        self.sets = [list() for _ in range(dict_size // associativity)]
+    
+    @property
+    def queue(self):
+        """The dictionary words in dict index order, with 0 for empty entries"""
+        return [entries[way] if way < len(entries) else 0 for entries in self.sets for way in range(self._ways)]
+    
+    def _set_index(self, high_bits):
+        return ((high_bits * HASH_MULTIPLIER) & HASH_MASK) >> self._hash_shift
+    
+    def set_indices(self, high_bits):
+        """Return the set index of every entry of an array of high bits"""
+        if len(self.sets) == 1:
+            return np.zeros(len(high_bits), dtype = np.uint64)
+        # uint64 multiplication wraps around just like the HASH_MASK in _set_index
+        return (high_bits.astype(np.uint64) * np.uint64(HASH_MULTIPLIER)) >> np.uint64(self._hash_shift)
+    
+    def encode(self, word, high_bits = None, set_index = None):
+        """Look up a nonzero word, update its set and return (tag, dict index)
+        
+        The high bits and the set index of the word can be passed in if 
+        already computed.
+        """
+        if high_bits is None:
+            high_bits = word >> self._num_low_bits
+        if set_index is None:
+            set_index = self._set_index(high_bits)
+        entries = self.sets[set_index]
+        if self._ways == 1:
+            # Direct mapped: a single entry to check and no order to keep
+            if entries and entries[0] >> self._num_low_bits == high_bits:
+                entry = entries[0]
+                entries[0] = word
+                return (HIT if entry == word else PARTIAL), set_index
+            entries[:] = [word]
+            return MISS, None
+        
+        for way, entry in enumerate(entries):
+            if entry >> self._num_low_bits == high_bits:
+                if way != 0:
+                    del entries[way]
+                    entries.insert(0, word)
+                else:
+                    entries[0] = word
+                return (HIT if entry == word else PARTIAL), (set_index << self._way_bits) + way
+        
+        entries.insert(0, word)
+        if len(entries) > self._ways:
+            entries.pop()
+        return MISS, None
+    
+    def decode_hit(self, hit_index):
+        """Return the dictionary word at hit_index and move it to the front of its set"""
+        entries = self.sets[hit_index >> self._way_bits]
+        word = entries.pop(hit_index & (self._ways - 1))
+        entries.insert(0, word)
+        return word
+    
+    def decode_partial(self, hit_index, low_bits):
+        """Return the word rebuilt from the entry at hit_index and low_bits"""
+        entries = self.sets[hit_index >> self._way_bits]
+        word = (entries.pop(hit_index & (self._ways - 1)) & self._high_bit_mask) | low_bits
+        entries.insert(0, word)
+        return word
+    
+    def decode_miss(self, word):
+        """Add a word read from the full words area to the front of its set"""
+        entries = self.sets[self._set_index(word >> self._num_low_bits)]
+        entries.insert(0, word)
+        if len(entries) > self._ways:
+            entries.pop()
 
 
 class WKCompressor():
     """Simple implementation of WK compression algorithm"""        
     
     def __init__(self, word_size_bytes = 8, packing_word_bytes = 8, 
-                 dict_size = 16, num_low_bits = 10, debug = False):
-        self.DEBUG = debug
+                 dict_size = 16, num_low_bits = 10, debug = False, stats = None, associativity = None):
+        # debug is kept for old callers and now just attaches a WKStats
+        if stats is None and debug:
+            stats = WKStats(dict_size)
+        self.stats = stats
         self._word_size_in_bytes = word_size_bytes
         self._packing_word_in_bytes = packing_word_bytes
         self._dict_size = dict_size
@@ -37,53 +289,111 @@ class WKCompressor():
         self._num_low_bits = num_low_bits
         self._low_bit_mask = (1 << self._num_low_bits) - 1
         self._high_bit_mask = ~(self._low_bit_mask)
+        
+        # associativity None selects the fully associative LRU dictionary, 
+        # and a power of 2 a HashedDictionary with that many entries per set
+        self._associativity = associativity
+        if associativity is None:
+            self._policy = LRU_POLICY
+        elif associativity < 1 or associativity & (associativity - 1) or associativity > dict_size:
+            raise ValueError("Associativity must be a power of 2 no larger than the dictionary size")
+        else:
+            self._policy = associativity.bit_length()
+    
+    def _new_dictionary(self, policy = None):
+        """Return an empty dictionary for a policy recorded in a page header, by default this compressor's"""
+        if policy is None:
+            policy = self._policy
+        if policy == LRU_POLICY:
+            return LRUDictionary(self._dict_size, self._num_low_bits)
+        return HashedDictionary(self._dict_size, self._num_low_bits, 1 << (policy - 1))
      
     def _pack(self, unpacked, data_size):
         """Pack data from a list into bytes"""
-        reps = (self._packing_word_in_bytes * BITS_PER_BYTE) // data_size   
-        packed = list()      
-        for n in range(0, len(unpacked), reps):
-            shift = self._packing_word_in_bytes * BITS_PER_BYTE - data_size
-            tmp = unpacked[n] << shift
-            for r in range(1, reps): 
-                try:
-                    tmp |=  unpacked[n + r] <<  (shift - (data_size * r))
-                except IndexError:
-                    break
-            packed.append(tmp)
-        if len(packed) == 0:
+        if len(unpacked) == 0:
             return bytearray()
-        
-        # Convert each element of the packed list into bytes and then use 
-        # the reduce function to add the elements into a single bytes object
-        packed_bytes_list = [x.to_bytes(self._packing_word_in_bytes, byteorder = "big") for x in packed]
-        packed = functools.reduce(lambda x,y: x+y, packed_bytes_list)
-        return packed    
+        return bitpack.pack(unpacked, data_size, self._packing_word_in_bytes).tobytes()
 
     def _unpack(self, packed_tags, data_size):
         """Extract and return a list of data packed into bytes"""
-        unused_bits = (self._packing_word_in_bytes * BITS_PER_BYTE) % data_size
-        reps = (self._packing_word_in_bytes * BITS_PER_BYTE) // data_size   
-        unpacked = list()
-        for n in range(0, len(packed_tags), self._packing_word_in_bytes):
-            tmp = int.from_bytes(packed_tags[n:n+self._packing_word_in_bytes], byteorder = "big")
-            for i in reversed(range(reps)):               
-                unpacked.append((tmp >> (data_size*i + unused_bits)) & (-1 + 2**data_size))
-            
-        return unpacked
+        return bitpack.unpack(packed_tags, data_size, self._packing_word_in_bytes).tolist()
         
              
-    def compress(self, src_bytes):  
-        """Compress a bytes-like object using the WK algorithm"""
-        # Convert given bytes-like object to an array of words
-        src_words = [int.from_bytes(src_bytes[n : n+self._word_size_in_bytes], byteorder = "big") 
-                     for n in range(0, len(src_bytes), self._word_size_in_bytes)] 
+    def _to_words(self, src_bytes):
+        """Convert a bytes-like object into big-endian words
+        
+        Word sizes with a NumPy dtype give an array viewing src_bytes, 
+        which _encode() and _count_tags() classify with a NumPy prepass. 
+        Other word sizes give a list of ints.
+        """
+        dtype = _WORD_DTYPES.get(self._word_size_in_bytes)
+        if dtype is not None and len(src_bytes) % self._word_size_in_bytes == 0:
+            return np.frombuffer(src_bytes, dtype = dtype)
+        return [int.from_bytes(src_bytes[n : n+self._word_size_in_bytes], byteorder = "big") 
+                for n in range(0, len(src_bytes), self._word_size_in_bytes)] 
+
+    def _max_compressed_size(self, num_words):
+        """Return an upper bound on the compressed size of a page of num_words words"""
+        return (HEADER_SIZE_BYTES + bitpack.packed_size(num_words, 2, self._packing_word_in_bytes) 
+                + num_words * self._word_size_in_bytes
+                + bitpack.packed_size(num_words, self._num_dict_index_bits, self._packing_word_in_bytes)
+                + bitpack.packed_size(num_words, self._num_low_bits, self._packing_word_in_bytes))
 
+    def _prepass(self, src_words, dictionary):
+        """Return the positions and values of the nonzero words of an array of words and the dictionary lookups
+        
+        Zero words need no dictionary lookup, so only the nonzero words 
+        are handed to the sequential WK loop. The lookups are the 
+        arguments of dictionary.encode() for each of them, as plain ints 
+        with their high bits, and for a hashed dictionary their set, 
+        precomputed.
+        """
+        nonzero = np.flatnonzero(src_words)
+        words = src_words[nonzero]
+        if self._num_low_bits < 8 * self._word_size_in_bytes:
+            high_bits = words >> words.dtype.type(self._num_low_bits)
+        else:
+            high_bits = np.zeros(len(words), dtype = np.uint8)
+        if isinstance(dictionary, HashedDictionary):
+            lookups = zip(words.tolist(), high_bits.tolist(), dictionary.set_indices(high_bits).tolist())
+        else:
+            lookups = zip(words.tolist(), high_bits.tolist())
+        return nonzero, words, lookups
+    
+    def _encode(self, src_words):
+        """Run the WK loop over the words of a page and return the unpacked sections"""
+        if not isinstance(src_words, np.ndarray):
+            return self._encode_list(src_words)
+        
+        # Zero words keep the ZERO tag the tags start with, and the full 
+        # words and low bits are gathered in bulk once the tags are known
+        dictionary = self._new_dictionary()
+        encode = dictionary.encode
+        nonzero, words, lookups = self._prepass(src_words, dictionary)
+        nonzero_tags = list()
+        dict_indices = list()
+        for lookup in lookups:
+            tag, hit_index = encode(*lookup)
+            nonzero_tags.append(tag)
+            if hit_index is not None:
+                dict_indices.append(hit_index)
+        
+        nonzero_tags = np.array(nonzero_tags, dtype = np.uint8)
+        tags = np.zeros(len(src_words), dtype = np.uint8)
+        tags[nonzero] = nonzero_tags
+        full_words = bytearray(words[nonzero_tags == MISS].tobytes())
+        # The mask is clamped to the word, as num_low_bits may be as wide as a word or wider
+        low_bit_mask = words.dtype.type(self._low_bit_mask & np.iinfo(words.dtype).max)
+        low_bits = (words[nonzero_tags == PARTIAL] & low_bit_mask).tolist()
+        return tags.tolist(), full_words, dict_indices, low_bits
+    
+    def _encode_list(self, src_words):
+        """Run the WK loop over a list of words and return the unpacked sections"""
         # Instantiate data structures to hold the elements for compression.
         # Full words are written directly to the compressed page so are 
         # stored in a bytearray. Others are added to lists where they 
         # are sent to the _pack() function to be packed into bytes.
-        lru_queue = list([0])        
+        dictionary = self._new_dictionary()
         tags = list()        
         full_words = bytearray()  
         dict_indices = list()
@@ -94,94 +404,152 @@ class WKCompressor():
         for word in src_words:
             if word == 0:
                 tags.append(ZERO)
-                
-            elif word in lru_queue:
-                tags.append(HIT)
-                hit_index = lru_queue.index(word)
-                dict_indices.append(hit_index)
-                
-                if hit_index != 0:
-                    lru_queue.insert(0, lru_queue.pop(hit_index))
-                                       
-            elif word >> self._num_low_bits in [entry >> self._num_low_bits for entry in lru_queue]:
-                tags.append(PARTIAL)
-                low_bits.append(word & self._low_bit_mask)
-                # Create a temporary list that matches the LRU queue but only 
-                # contains the high bits of each number for easy comparison
-                high_bits = [entry >> self._num_low_bits for entry in lru_queue]
-                hit_index = high_bits.index(word >> self._num_low_bits)
+                continue
+            
+            tag, hit_index = dictionary.encode(word)
+            tags.append(tag)
+            if tag == MISS:
+                full_words += word.to_bytes(self._word_size_in_bytes, byteorder = "big")
+            else:
                 dict_indices.append(hit_index)
-                
-                # Move the dictionary entry to the front of the queue and replace with new low bits
-                if hit_index != 0:
-                    lru_queue.pop(hit_index)
-                    lru_queue.insert(0,word)
+                if tag == PARTIAL:
+                    low_bits.append(word & self._low_bit_mask)
+        
+        return tags, full_words, dict_indices, low_bits
+    
+    def _count_tags(self, src_words, index_counts = None):
+        """Run the WK loop over a list of words and return the number of words given each tag
+        
+        If index_counts is given, the dict index of every HIT and PARTIAL 
+        is counted into it as well.
+        """
+        dictionary = self._new_dictionary()
+        counts = [0] * 4
+        if isinstance(src_words, np.ndarray):
+            nonzero, _, lookups = self._prepass(src_words, dictionary)
+            counts[ZERO] = len(src_words) - len(nonzero)
+            encode = dictionary.encode
+            if index_counts is None:
+                for lookup in lookups:
+                    counts[encode(*lookup)[0]] += 1
             else:
-                tags.append(MISS)
-                full_words += word.to_bytes(self._word_size_in_bytes, byteorder = "big")
-                if len(lru_queue) != self._dict_size:
-                    lru_queue.insert(0,word)
-                else: 
-                    lru_queue.pop()
-                    lru_queue.insert(0,word)
-         
+                for lookup in lookups:
+                    tag, hit_index = encode(*lookup)
+                    counts[tag] += 1
+                    if hit_index is not None:
+                        index_counts[hit_index] += 1
+            return counts
+        
+        if index_counts is None:
+            for word in src_words:
+                if word == 0:
+                    counts[ZERO] += 1
+                else:
+                    counts[dictionary.encode(word)[0]] += 1
+            return counts
+        
+        for word in src_words:
+            if word == 0:
+                counts[ZERO] += 1
+            else:
+                tag, hit_index = dictionary.encode(word)
+                counts[tag] += 1
+                if hit_index is not None:
+                    index_counts[hit_index] += 1
+        return counts
+    
+    def _section_sizes(self, num_words, counts):
+        """Return the SectionSizes of a compressed page from its tag counts"""
+        tags = bitpack.packed_size(num_words, 2, self._packing_word_in_bytes)
+        full_words = counts[MISS] * self._word_size_in_bytes
+        dict_indices = bitpack.packed_size(counts[HIT] + counts[PARTIAL], self._num_dict_index_bits, 
+                                           self._packing_word_in_bytes)
+        low_bits = bitpack.packed_size(counts[PARTIAL], self._num_low_bits, self._packing_word_in_bytes)
+        total = HEADER_SIZE_BYTES + tags + full_words + dict_indices + low_bits
+        return SectionSizes(total, HEADER_SIZE_BYTES, tags, full_words, dict_indices, low_bits)
+    
+    def _pack_sections(self, num_words, tags, full_words, dict_indices, low_bits):
+        """Pack the compression data and return the header followed by each section"""
         # Pack the compression data compactly into bytes       
         packed_tags = self._pack(tags, 2)
         packed_dict_indices = self._pack(dict_indices, self._num_dict_index_bits)
         packed_low_bits = self._pack(low_bits, self._num_low_bits)
         
         # Create the header section
-        num_words = len(src_words)   
         dict_indices_offset = HEADER_SIZE_BYTES + len(packed_tags) + len(full_words)
         low_bits_offset = dict_indices_offset + len(packed_dict_indices)
         end_of_compressed_offset = low_bits_offset + len(packed_low_bits)
-        header_list = [num_words, dict_indices_offset, low_bits_offset, end_of_compressed_offset]
+        header_list = [num_words | (self._policy << POLICY_SHIFT), dict_indices_offset, low_bits_offset, 
+                       end_of_compressed_offset]
         header = functools.reduce(lambda x,y: x+y, [x.to_bytes(4, byteorder = "big") for x in header_list])
         
+        return header, packed_tags, full_words, packed_dict_indices, packed_low_bits
+    
+    def compress(self, src_bytes):  
+        """Compress a bytes-like object using the WK algorithm"""
+        if self.stats is not None:
+            return self._compress_with_stats(src_bytes)
+        
+        # Convert given bytes-like object to an array of words
+        src_words = self._to_words(src_bytes)
+        tags, full_words, dict_indices, low_bits = self._encode(src_words)
+        header, packed_tags, full_words, packed_dict_indices, packed_low_bits = \
+            self._pack_sections(len(src_words), tags, full_words, dict_indices, low_bits)
+        
         # Construct the final compressed output 
         compressed_page = bytearray()
         compressed_page += header + packed_tags + full_words + packed_dict_indices + packed_low_bits
+        return compressed_page
+    
+    def _compress_with_stats(self, src_bytes):
+        """compress() that also records the page and the time of each stage in self.stats"""
+        stats = self.stats
+        start = time.perf_counter()
+        src_words = self._to_words(src_bytes)
+        converted = time.perf_counter()
+        tags, full_words, dict_indices, low_bits = self._encode(src_words)
+        encoded = time.perf_counter()
+        sections = self._pack_sections(len(src_words), tags, full_words, dict_indices, low_bits)
+        compressed_page = bytearray()
+        compressed_page += b"".join(sections)
+        packed = time.perf_counter()
         
-        if self.DEBUG: 
-            print("HEADER CONTENTS:\tWord 1: ",hex(int.from_bytes(header[:4], byteorder = "big")),"\t\tWord 2: ", hex(int.from_bytes(header[4:8], byteorder = "big")), 
-                  "\t\tWord 3: ", hex(int.from_bytes(header[8:12], byteorder = "big")), "\t\tWord 4: ", hex(int.from_bytes(header[12:16], byteorder = "big")))
-            print("LRU QUEUE CONTENTS:")
-            for index, value in enumerate(lru_queue):
-                print("Index = ", index, "\tValue = ", hex(value), "\tBinary = ", bin(value), "\tLow bits = ", bin(value & 0x3ff))
-            
-            low_count = 0
-            index_count = 0
-            for num, t in enumerate(tags[:10]): 
-                print("Word number ", num, "=", hex(src_words[num]), "\t\tTag = ", t, end = "\t")
-                if t == 0:
-                    print("ZERO")
-                elif t == 1:
-                    print("PARTIAL","\tDict Index = ", dict_indices[index_count], "\tLow Bits = ", hex(low_bits[low_count]))
-                    low_count += 1
-                    index_count += 1
-                elif t == 2:
-                    print("MISS")
-                else: 
-                    print("FULL MATCH", "\tDict Index = ", dict_indices[index_count])
-                    index_count += 1
-            
-            print("\n\n=================IN BYTES=================")
-            print("Starting length:\t\t\t", len(src_bytes))
-            print("End compressed length:\t\t\t", len(compressed_page))
-            print("Achieved ratio:\t\t\t\t", "{0:.2f}".format(len(compressed_page) / len(src_bytes)))
-            print("Length of Header:\t\t\t", len(header))
-            print("Length of Tags Area:\t\t\t" , len(packed_tags))
-            print("Length of Full Words Area:\t\t", len(full_words))
-            print("Length of Dictionary Indices Area:\t", len(packed_dict_indices))
-            print("Length of Low Bits Area:\t\t", len(packed_low_bits))
-            #END DEBUG 
-              
+        stats.add_time("to_words", converted - start)
+        stats.add_time("encode", encoded - converted)
+        stats.add_time("pack", packed - encoded)
+        sizes = [len(compressed_page)] + [len(section) for section in sections]
+        stats.add_page(len(src_bytes), np.bincount(tags, minlength = 4), sizes, dict_indices)
         return compressed_page
     
-    def decompress(self, compressed_page):
-        """Decompress a bytes-like object compressed by the WK algorithm"""
+    def estimate(self, src_bytes):
+        """Return the SectionSizes that compress() would produce without building the page
+        
+        Only the tags are counted; nothing is packed or copied, and the 
+        total always equals len(compress(src_bytes)).
+        """
+        src_words = self._to_words(src_bytes)
+        if self.stats is None:
+            return self._section_sizes(len(src_words), self._count_tags(src_words))
+        
+        start = time.perf_counter()
+        index_counts = [0] * self._dict_size
+        counts = self._count_tags(src_words, index_counts)
+        sizes = self._section_sizes(len(src_words), counts)
+        self.stats.add_time("estimate", time.perf_counter() - start)
+        self.stats.add_page(len(src_bytes), counts, sizes, index_counts = index_counts)
+        return sizes
+    
+    def decompress(self, compressed_page, out = None):
+        """Decompress a bytes-like object compressed by the WK algorithm
+        
+        The page is written into out, a writable buffer of exactly the 
+        page's size, if one is given, and into a new bytearray otherwise.
+        Either is returned.
+        """
         # Read in the from the header to determine metadata about the compressed page
         num_words = int.from_bytes(compressed_page[:4], byteorder = "big")
+        policy = num_words >> POLICY_SHIFT
+        num_words &= NUM_WORDS_MASK
         dict_indices_offset = int.from_bytes(compressed_page[4:8], byteorder = "big")
         low_bits_offset = int.from_bytes(compressed_page[8:12], byteorder = "big")
         end_of_compressed_offset = int.from_bytes(compressed_page[12:16], byteorder = "big")      
@@ -193,69 +561,162 @@ class WKCompressor():
         packed_dict_indices = compressed_page[dict_indices_offset : low_bits_offset]
         packed_low_bits = compressed_page[low_bits_offset : end_of_compressed_offset]
 
-        # Unpack data back into list form 
-        tags = self._unpack(packed_tags, 2)
+        # Unpack data back into list form, except for the tags which the
+        # decoder uses as an array
+        if self.stats is not None:
+            start = time.perf_counter()
+        tags = bitpack.unpack(packed_tags, 2, self._packing_word_in_bytes)
         dict_indices = self._unpack(packed_dict_indices, self._num_dict_index_bits)
         low_bits = self._unpack(packed_low_bits, self._num_low_bits)
-             
-        # Create the recency queue and counters that will be used as indices
-        # into the relevant lists.
-        lru_queue = list([0])
+        if self.stats is None:
+            return self._decode(num_words, tags, full_words, dict_indices, low_bits, out, policy)
+        
+        unpacked = time.perf_counter()
+        uncompressed_page = self._decode(num_words, tags, full_words, dict_indices, low_bits, out, policy)
+        self.stats.add_time("unpack", unpacked - start)
+        self.stats.add_time("decode", time.perf_counter() - unpacked)
+        self.stats.decompressed_pages += 1
+        return uncompressed_page
+    
+    def _decode(self, num_words, tags, full_words, dict_indices, low_bits, out = None, policy = None):
+        """Rebuild a page from its unpacked tags, full words, dict indices and low bits
+        
+        The page is written into out if given and into a new bytearray 
+        otherwise. Only the nonzero words go through the dictionary; the 
+        zero words are filled in bulk, the MISS words copied straight from
+        the full words area and the dictionary words written through a 
+        NumPy view of the output.
+        """
+        page_size = num_words * self._word_size_in_bytes
+        if out is None:
+            out = bytearray(page_size)
+            page = memoryview(out)
+        else:
+            page = memoryview(out).cast('B')
+            if len(page) != page_size:
+                raise ValueError("Output buffer must hold exactly " + str(page_size) + " bytes")
+            page[:] = bytes(page_size)
+        
+        dtype = _WORD_DTYPES.get(self._word_size_in_bytes)
+        if dtype is None:
+            self._decode_bytes(page, num_words, tags, full_words, dict_indices, low_bits, policy)
+            return out
+        
+        dictionary = self._new_dictionary(policy)
+        words = np.frombuffer(page, dtype = dtype)
+        tags = np.asarray(tags, dtype = np.uint8)[:num_words]
+        nonzero = np.flatnonzero(tags)
+        nonzero_tags = tags[nonzero]
+        is_miss = nonzero_tags == MISS
+        miss_words = np.frombuffer(full_words, dtype = dtype)
+        words[nonzero[is_miss]] = miss_words
+        
+        # Counters used as indices into the relevant lists
+        full_words_count = 0
+        dict_count = 0
+        low_bits_count = 0
+        miss_words = miss_words.tolist()
+        dict_words = list()
+        for tag in nonzero_tags.tolist():
+            if tag == MISS:
+                dictionary.decode_miss(miss_words[full_words_count])
+                full_words_count += 1
+            elif tag == HIT:
+                dict_words.append(dictionary.decode_hit(dict_indices[dict_count]))
+                dict_count += 1
+            else:
+                dict_words.append(dictionary.decode_partial(dict_indices[dict_count], low_bits[low_bits_count]))
+                dict_count += 1
+                low_bits_count += 1
+        
+        words[nonzero[~is_miss]] = np.array(dict_words, dtype = np.uint64)
+        return out
+    
+    def _decode_bytes(self, page, num_words, tags, full_words, dict_indices, low_bits, policy = None):
+        """Decode into a zeroed memoryview word by word, for word sizes without a NumPy dtype"""
+        dictionary = self._new_dictionary(policy)
+        word_size = self._word_size_in_bytes
         full_words_count = 0
         dict_count = 0
         low_bits_count = 0
         
-        uncompressed_page = bytearray()    
         for n in range(num_words):
             tag = tags[n]
             if tag == ZERO:
-                uncompressed_page += bytearray(self._word_size_in_bytes)
-                
+                continue
+            
             elif tag == PARTIAL:
-                hit_index = dict_indices[dict_count]
-                dict_word = lru_queue[hit_index]
+                word = dictionary.decode_partial(dict_indices[dict_count], low_bits[low_bits_count])
                 dict_count += 1
-                word_low_bits = low_bits[low_bits_count]
                 low_bits_count += 1
-                
-                word_high_bits = dict_word & self._high_bit_mask
-                word = word_high_bits | word_low_bits
-                word_bytes = word.to_bytes(self._word_size_in_bytes,byteorder = "big")
-                
-                if hit_index != 0:
-                    lru_queue.pop(hit_index)
-                    lru_queue.insert(0,word)
-                    
-                uncompressed_page += word_bytes
 
             elif tag == MISS:
-                word_bytes = full_words[full_words_count : full_words_count+self._word_size_in_bytes]
-                word = int.from_bytes(word_bytes, byteorder ="big")
-                full_words_count += self._word_size_in_bytes
-                if len(lru_queue) != self._dict_size:
-                    lru_queue.insert(0,word)
-                else: 
-                    lru_queue.pop()
-                    lru_queue.insert(0,word)
-                uncompressed_page += word_bytes
+                word_bytes = full_words[full_words_count : full_words_count+word_size]
+                full_words_count += word_size
+                dictionary.decode_miss(int.from_bytes(word_bytes, byteorder = "big"))
+                page[n*word_size : (n+1)*word_size] = word_bytes
+                continue
                     
             elif tag == HIT: 
-                hit_index = dict_indices[dict_count]
+                word = dictionary.decode_hit(dict_indices[dict_count])
                 dict_count += 1
-                dict_word = lru_queue[hit_index]
-                dict_word_bytes = dict_word.to_bytes(self._word_size_in_bytes, byteorder = "big")  
-                if hit_index != 0:
-                    lru_queue.insert(0, lru_queue.pop(hit_index))                    
-                uncompressed_page += dict_word_bytes           
-        
-        if self.DEBUG:
-            print("\n\n================In decompress()==================")
-            print("Num words = ", num_words)
-            print("Dict Indices offset = ", dict_indices_offset)
-            print("Low Bits offset = ", low_bits_offset)
-            print("End of page offset = ", end_of_compressed_offset)
+            page[n*word_size : (n+1)*word_size] = word.to_bytes(word_size, byteorder = "big")           
+    
+    def compress_many(self, buffer, page_size = PAGE_SIZE_BYTES):
+        """Compress a buffer of consecutive pages into a single output buffer
 
-        return uncompressed_page
+        Returns the compressed pages back to back in one bytearray together 
+        with an offsets index of num_pages + 1 entries, so that page n is 
+        compressed[offsets[n] : offsets[n+1]]. Each page is byte-identical 
+        to the result of compress() on that page.
+        """
+        buffer = memoryview(buffer).cast('B')
+        if page_size % self._word_size_in_bytes != 0 or len(buffer) % page_size != 0:
+            raise ValueError("Buffer must hold whole pages of whole words")
+        num_pages = len(buffer) // page_size
+        words_per_page = page_size // self._word_size_in_bytes
+        
+        # Convert every page to words at once when the word size allows it
+        dtype = _WORD_DTYPES.get(self._word_size_in_bytes)
+        if dtype is not None:
+            all_words = np.frombuffer(buffer, dtype = dtype).reshape(num_pages, words_per_page)
+        
+        compressed = bytearray(num_pages * self._max_compressed_size(words_per_page))
+        offsets = np.zeros(num_pages + 1, dtype = np.int64)
+        end = 0
+        for n in range(num_pages):
+            if dtype is not None:
+                src_words = all_words[n]
+            else:
+                src_words = self._to_words(buffer[n*page_size : (n+1)*page_size])
+            tags, full_words, dict_indices, low_bits = self._encode(src_words)
+            sections = self._pack_sections(words_per_page, tags, full_words, dict_indices, low_bits)
+            for section in sections:
+                compressed[end : end+len(section)] = section
+                end += len(section)
+            offsets[n+1] = end
+            if self.stats is not None:
+                sizes = [end - int(offsets[n])] + [len(section) for section in sections]
+                self.stats.add_page(page_size, np.bincount(tags, minlength = 4), sizes, dict_indices)
+        
+        del compressed[end:]
+        return compressed, offsets
+    
+    def decompress_many(self, compressed, offsets):
+        """Decompress pages produced by compress_many() into a single buffer"""
+        compressed = memoryview(compressed).cast('B')
+        offsets = [int(offset) for offset in offsets]
+        page_sizes = [(int.from_bytes(compressed[offset : offset+4], byteorder = "big") & NUM_WORDS_MASK) 
+                      * self._word_size_in_bytes 
+                      for offset in offsets[:-1]]
+        
+        uncompressed = bytearray(sum(page_sizes))
+        uncompressed_view = memoryview(uncompressed)
+        end = 0
+        for n, page_size in enumerate(page_sizes):
+            self.decompress(compressed[offsets[n] : offsets[n+1]], out = uncompressed_view[end : end+page_size])
+            end += page_size
+        return uncompressed
     
     @staticmethod
     def create_lru_queue_histogram(compressor, compressed_page):
@@ -0,0 +1,189 @@
+'''
+Created on Oct 16, 2026
+
+Provides class WKHuffmanCompressor, which Huffman codes each section of a
+WK compressed page with a code built for that section's own alphabet
+instead of Huffman coding the packed WK bytes. The tags are coded four
+to a symbol, the dict indices and low bits as whole fields and the full
+words byte by byte, so no code straddles a field boundary. Every section
+falls back to plain packing when that is smaller than its Huffman code.
+'''
+
+import time
+import argparse
+import functools
+import numpy as np
+from wk import WKCompressor, PARTIAL, MISS, HIT, POLICY_SHIFT, NUM_WORDS_MASK
+import bitpack
+import huffman
+import trace_reader
+
+RAW = 0
+HUFFMAN = 1
+HEADER_SIZE_BYTES = 4
+# Fields of raw sections and of the Huffman code tables are packed into 4 byte words,
+# or into 8 byte words for fields wider than 4 bytes
+SECTION_PACKING_BYTES = 4
+WIDE_SECTION_PACKING_BYTES = 8
+TAGS_PER_SYMBOL = 4
+
+
+class WKHuffmanCompressor():
+    """WK compression with a separate Huffman code for each section of the page"""
+
+    def __init__(self, word_size_bytes = 8, dict_size = 16, num_low_bits = 10,
+                 max_code_length = huffman.MAX_CODE_LENGTH, associativity = None):
+        self._wk = WKCompressor(word_size_bytes = word_size_bytes, dict_size = dict_size,
+                                num_low_bits = num_low_bits, associativity = associativity)
+        self._max_code_length = max_code_length
+
+    def compress(self, src_bytes):
+        """Compress a bytes-like object using WK with per-section Huffman coding"""
+        wk = self._wk
+        src_words = wk._to_words(src_bytes)
+        tags, full_words, dict_indices, low_bits = wk._encode(src_words)
+        tag_symbols = bitpack.pack(tags, 2, 1) if tags else np.zeros(0, dtype = np.uint8)
+
+        compressed_page = bytearray()
+        # The header records the dictionary policy like the WK page header does
+        compressed_page += (len(src_words) | (wk._policy << POLICY_SHIFT)).to_bytes(HEADER_SIZE_BYTES, byteorder = "big")
+        compressed_page += self._encode_section(tag_symbols, 2 * TAGS_PER_SYMBOL)
+        compressed_page += self._encode_section(np.frombuffer(full_words, dtype = np.uint8), 8)
+        compressed_page += self._encode_section(dict_indices, wk._num_dict_index_bits)
+        compressed_page += self._encode_section(low_bits, wk._num_low_bits)
+        return compressed_page
+
+    def decompress(self, compressed_page, out = None):
+        """Decompress a bytes-like object compressed by compress(), into out if given"""
+        wk = self._wk
+        compressed_page = memoryview(compressed_page).cast('B')
+        num_words = int.from_bytes(compressed_page[:HEADER_SIZE_BYTES], byteorder = "big")
+        policy = num_words >> POLICY_SHIFT
+        num_words &= NUM_WORDS_MASK
+        offset = HEADER_SIZE_BYTES
+
+        # The tags give the number of entries in every other section
+        num_tag_symbols = -(-num_words // TAGS_PER_SYMBOL)
+        tag_symbols, offset = self._decode_section(compressed_page, offset, num_tag_symbols, 2 * TAGS_PER_SYMBOL)
+        tags = bitpack.unpack(tag_symbols.astype(np.uint8), 2, 1)[:num_words]
+        counts = np.bincount(tags, minlength = 4)
+
+        full_words, offset = self._decode_section(compressed_page, offset,
+                                                  int(counts[MISS]) * wk._word_size_in_bytes, 8)
+        dict_indices, offset = self._decode_section(compressed_page, offset, int(counts[HIT] + counts[PARTIAL]),
+                                                    wk._num_dict_index_bits)
+        low_bits, offset = self._decode_section(compressed_page, offset, int(counts[PARTIAL]), wk._num_low_bits)
+        return wk._decode(num_words, tags, full_words.astype(np.uint8).tobytes(),
+                          dict_indices.tolist(), low_bits.tolist(), out, policy)
+
+    def _encode_section(self, symbols, symbol_bits):
+        """Return the smaller of the packed and the Huffman coded form of a section"""
+        symbols = np.asarray(symbols, dtype = np.uint64)
+        if len(symbols) == 0:
+            return b""
+        packing_bytes = _packing_bytes(symbol_bits)
+        raw_size = bitpack.packed_size(len(symbols), symbol_bits, packing_bytes)
+
+        # Size the Huffman coded section from the code lengths before encoding
+        # it. The histogram only holds the symbols present, as wide fields 
+        # have far more possible values than a page has symbols.
+        used, counts = np.unique(symbols, return_counts = True)
+        used_lengths = huffman.code_lengths(counts, self._max_code_length)
+        table = (len(used) - 1).to_bytes(2, byteorder = "big") \
+            + bitpack.pack(used, symbol_bits, packing_bytes).tobytes() \
+            + bitpack.pack(used_lengths, 4, SECTION_PACKING_BYTES).tobytes()
+        num_bits = int((counts * used_lengths).sum())
+        if len(table) + 4 + -(-num_bits // 8) >= raw_size:
+            return bytes([RAW]) + bitpack.pack(symbols, symbol_bits, packing_bytes).tobytes()
+
+        num_bits, coded = huffman.encode_symbols(symbols.tolist(), used.tolist(), used_lengths.tolist())
+        return bytes([HUFFMAN]) + table + num_bits.to_bytes(4, byteorder = "big") + coded
+
+    def _decode_section(self, compressed_page, offset, count, symbol_bits):
+        """Decode a section of count symbols starting at offset and return the symbols and the next offset"""
+        if count == 0:
+            return np.zeros(0, dtype = np.uint64), offset
+        method = compressed_page[offset]
+        offset += 1
+        packing_bytes = _packing_bytes(symbol_bits)
+        if method == RAW:
+            size = bitpack.packed_size(count, symbol_bits, packing_bytes)
+            symbols = bitpack.unpack(compressed_page[offset : offset+size], symbol_bits, packing_bytes)
+            return symbols[:count].astype(np.uint64), offset + size
+        elif method != HUFFMAN:
+            raise ValueError("Unknown section coding " + str(method))
+
+        num_used = int.from_bytes(compressed_page[offset : offset+2], byteorder = "big") + 1
+        table_size = 2 + bitpack.packed_size(num_used, symbol_bits, packing_bytes) \
+            + bitpack.packed_size(num_used, 4, SECTION_PACKING_BYTES)
+        tables = _section_tables(bytes(compressed_page[offset : offset+table_size]), symbol_bits)
+        offset += table_size
+        num_bits = int.from_bytes(compressed_page[offset : offset+4], byteorder = "big")
+        offset += 4
+        coded_size = -(-num_bits // 8)
+        symbols = huffman.decode_symbols(compressed_page[offset : offset+coded_size], num_bits, tables)
+        if len(symbols) != count:
+            raise ValueError("Section decoded to " + str(len(symbols)) + " symbols instead of " + str(count))
+        return symbols, offset + coded_size
+
+
+def _packing_bytes(symbol_bits):
+    return SECTION_PACKING_BYTES if symbol_bits <= 8 * SECTION_PACKING_BYTES else WIDE_SECTION_PACKING_BYTES
+
+
+@functools.lru_cache(maxsize = huffman.DECODE_TABLE_CACHE_SIZE)
+def _section_tables(table, symbol_bits):
+    """Return the Huffman lookup tables for a section's code table, cached by its bytes"""
+    num_used = int.from_bytes(table[:2], byteorder = "big") + 1
+    packing_bytes = _packing_bytes(symbol_bits)
+    symbols_size = bitpack.packed_size(num_used, symbol_bits, packing_bytes)
+    symbols = bitpack.unpack(table[2 : 2+symbols_size], symbol_bits, packing_bytes)[:num_used]
+    lengths = bitpack.unpack(table[2+symbols_size:], 4, SECTION_PACKING_BYTES)[:num_used]
+    return huffman.lookup_tables(symbols.astype(np.uint64), lengths)
+
+
+def compare(pages, word_size_bytes = 8, dict_size = 16, num_low_bits = 10):
+    """Compress pages with the two-stage and the fused wk-huffman paths and return a row of results for each"""
+    wk = WKCompressor(word_size_bytes = word_size_bytes, dict_size = dict_size, num_low_bits = num_low_bits)
+    fused = WKHuffmanCompressor(word_size_bytes = word_size_bytes, dict_size = dict_size, num_low_bits = num_low_bits)
+    paths = [("wk-huffman", lambda page : huffman.compress(wk.compress(page)),
+              lambda compressed : wk.decompress(huffman.decompress(compressed))),
+             ("wk-huffman-fused", fused.compress, fused.decompress)]
+    uncompressed_bytes = sum(len(page) for page in pages)
+
+    rows = list()
+    for name, compress, decompress in paths:
+        start = time.perf_counter()
+        compressed = [compress(page) for page in pages]
+        compress_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for page, compressed_page in zip(pages, compressed):
+            if decompress(compressed_page) != page:
+                raise AssertionError(name + " did not reproduce the original page")
+        decompress_seconds = time.perf_counter() - start
+        rows.append({"algorithm" : name,
+                     "ratio" : sum(len(c) for c in compressed) / uncompressed_bytes,
+                     "compress_mb_per_s" : uncompressed_bytes / compress_seconds / 1e6,
+                     "decompress_mb_per_s" : uncompressed_bytes / decompress_seconds / 1e6})
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compare the two-stage and fused wk-huffman paths on a trace")
+    parser.add_argument("trace")
+    parser.add_argument("word_size_bytes", type = int, nargs = "?", default = 8)
+    parser.add_argument("dict_size", type = int, nargs = "?", default = 16)
+    parser.add_argument("num_low_bits", type = int, nargs = "?", default = 10)
+    parser.add_argument("--pages", type = int, default = 1000, help = "number of pages to compress")
+    args = parser.parse_args()
+
+    pages = list()
+    for page in trace_reader.read_pages(args.trace):
+        if len(pages) == args.pages:
+            break
+        pages.append(bytes(page.data))
+
+    print("algorithm\tratio\tcompress MB/s\tdecompress MB/s")
+    for row in compare(pages, args.word_size_bytes, args.dict_size, args.num_low_bits):
+        print(row["algorithm"], "{0:.4f}".format(row["ratio"]), "{0:.2f}".format(row["compress_mb_per_s"]),
+              "{0:.2f}".format(row["decompress_mb_per_s"]), sep = "\t")